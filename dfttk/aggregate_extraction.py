@@ -1,6 +1,8 @@
 # Standard library imports
 import os
 import glob
+import shutil
+from collections.abc import Iterator
 
 # Related third party imports
 import pandas as pd
@@ -13,9 +15,10 @@ from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 from dfttk.data_extraction import (
     extract_volume,
     extract_energy,
-    extract_tot_mag_data,
+    extract_last_mag_data,
+    format_mag_table,
 )
-from dfttk.magnetism import determine_magnetic_ordering
+from dfttk.magnetism import determine_magnetic_orderings
 
 
 def extract_configuration_data(
@@ -24,9 +27,10 @@ def extract_configuration_data(
     oszicar_name: str = "OSZICAR.3static",
     contcar_name: str = "CONTCAR.3static",
     collect_mag_data: bool = False,
-    magmom_tolerance: float = 1e-12,
+    magmom_tolerance: float | dict[str, float] = 1e-12,
     total_magnetic_moment_tolerance: float = 1e-12,
-) -> pd.DataFrame:
+    return_mag_table: bool = False,
+) -> pd.DataFrame | tuple[pd.DataFrame, pd.DataFrame]:
     """Extracts the volume, configuration, energy, number of atoms, and magnetization data (if specified) from calculations
     run by ev_curve_series and returns a pandas DataFrame.
 
@@ -37,11 +41,17 @@ def extract_configuration_data(
         contcar_name: name of the CONTCAR file. Defaults to "CONTCAR".
         collect_mag_data: if True, collect the magnetization data using extract_tot_mag_data. Defaults to
         False.
-        magmom_tolerance: the tolerance for the total magnetic moment to be considered zero. Defaults to 0.
+        magmom_tolerance: the tolerance for the total magnetic moment to be considered zero, or a dict of
+        tolerances per species. The magnetic orderings of all volumes are determined in one pass with
+        magnetism.determine_magnetic_orderings. Defaults to 1e-12.
+        return_mag_table: if True (and collect_mag_data is True), the per-ion magnetization data is returned as a
+        separate long table with columns 'config', 'volume', 'ion', 'species', 's', 'p', 'd', 'tot' instead of a
+        nested 'mag_data' DataFrame in each row. Defaults to False.
 
     Returns:
         pandas DataFrame: a pandas DataFrame containing the volume, configuration, energy, number of atoms, and
-        magnetization data (if specified)
+        magnetization data (if specified). If return_mag_table is True, a tuple of this DataFrame and the long
+        magnetization table.
     """
 
     # Find the index where "config_" starts and add its length
@@ -49,6 +59,7 @@ def extract_configuration_data(
     config = path[start:]  # get the string following "config_"
 
     row_list = []
+    mag_data_list = []
     for vol_dir in glob.glob(os.path.join(path, "vol_*")):
         outcar_path = os.path.join(vol_dir, outcar_name)
         if not os.path.isfile(outcar_path):
@@ -73,12 +84,15 @@ def extract_configuration_data(
         vol_per_atom = vol / number_of_atoms
         space_group = SpacegroupAnalyzer(struct).get_space_group_symbol()
         if collect_mag_data == True:
-            mag_data = extract_tot_mag_data(outcar_path)
+            last_mag_data = extract_last_mag_data(outcar_path)
+            mag_data = last_mag_data[["#_of_ion", "tot"]]
             total_magnetic_moment = mag_data["tot"].sum()
-            magnetic_ordering = determine_magnetic_ordering(
-                mag_data,
-                magmom_tolerance=magmom_tolerance,
-                total_magnetic_moment_tolerance=total_magnetic_moment_tolerance,
+            mag_data_list.append(
+                last_mag_data.assign(
+                    config=config,
+                    volume=vol,
+                    species=[site.species_string for site in struct],
+                )
             )
 
             row = {
@@ -89,9 +103,10 @@ def extract_configuration_data(
                 "energy": energy,
                 "energy_per_atom": energy_per_atom,
                 "total_magnetic_moment": total_magnetic_moment,
-                "magnetic_ordering": magnetic_ordering,
-                "mag_data": mag_data,
+                "magnetic_ordering": None,
             }
+            if not return_mag_table:
+                row["mag_data"] = mag_data
         else:
             row = {
                 "config": config,
@@ -104,6 +119,18 @@ def extract_configuration_data(
             }
         row_list.append(row)
     df = pd.DataFrame(row_list)
+    mag_table = _concat_mag_tables(mag_data_list)
+    if collect_mag_data and not df.empty:
+        magnetic_orderings = determine_magnetic_orderings(
+            mag_table,
+            magmom_tolerance=magmom_tolerance,
+            total_magnetic_moment_tolerance=total_magnetic_moment_tolerance,
+        )
+        df["magnetic_ordering"] = magnetic_orderings.reindex(
+            pd.MultiIndex.from_frame(df[["config", "volume"]])
+        ).to_numpy()
+    if return_mag_table:
+        return df, mag_table
     return df
 
 
@@ -113,9 +140,10 @@ def recursive_extract_configuration_data(
     oszicar_name: str = "OSZICAR",
     contcar_name: str = "CONTCAR",
     collect_mag_data: bool = False,
-    magmom_tolerance: float = 0,
+    magmom_tolerance: float | dict[str, float] = 0,
     total_magnetic_moment_tolerance: float = 1e-12,
-) -> pd.DataFrame:
+    return_mag_table: bool = False,
+) -> pd.DataFrame | tuple[pd.DataFrame, pd.DataFrame]:
     """convenience function to extract configuration data from multiple config directories.
     Runs extract_configuration_data for each config directory in a list.
  
@@ -127,9 +155,12 @@ def recursive_extract_configuration_data(
         collect_mag_data: if True, collect the magnetization data using extract_tot_mag_data. Defaults to
         False.
         magmom_tolerance: the tolerance for the total magnetic moment to be considered zero. Defaults to 0.
+        return_mag_table: if True, also return the long magnetization table of all configs. See
+        extract_configuration_data. Defaults to False.
 
     """
     df_list = []
+    mag_table_list = []
     for config_dir in config_dirs:
         try:
             config_df = extract_configuration_data(
@@ -140,9 +171,204 @@ def recursive_extract_configuration_data(
                 collect_mag_data=collect_mag_data,
                 magmom_tolerance=magmom_tolerance,
                 total_magnetic_moment_tolerance=total_magnetic_moment_tolerance,
+                return_mag_table=return_mag_table,
             )
+            if return_mag_table:
+                config_df, config_mag_table = config_df
+                mag_table_list.append(config_mag_table)
             df_list.append(config_df)
         except Exception as e:
             print(f"Error in {config_dir}: {e}")
     df = pd.concat(df_list, ignore_index=True)
+    if return_mag_table:
+        return df, _concat_mag_tables(mag_table_list)
     return df
+
+
+def iter_configuration_data(
+    config_dirs: list[str],
+    batch_size: int = 1000,
+    outcar_name: str = "OUTCAR",
+    oszicar_name: str = "OSZICAR",
+    contcar_name: str = "CONTCAR",
+    collect_mag_data: bool = False,
+    magmom_tolerance: float | dict[str, float] = 0,
+    total_magnetic_moment_tolerance: float = 1e-12,
+) -> Iterator[pd.DataFrame]:
+    """Streaming version of recursive_extract_configuration_data. Runs extract_configuration_data for each
+    config directory and yields the rows in batches instead of holding all of them in memory.
+
+    If collect_mag_data is True, the per-ion 'mag_data' DataFrame of each row is replaced by a 'magmoms'
+    column containing the list of 'tot' magnetic moments ordered by ion, so the batches can be written to
+    columnar formats.
+
+    Args:
+        config_dirs: list of paths to config directories that will be passed to extract_configuration_data()
+        batch_size: yield a batch once it holds at least this many rows. Defaults to 1000.
+        outcar_name: name of the OUTCAR file. Defaults to "OUTCAR".
+        oszicar_name: name of the OSZICAR file. Defaults to "OSZICAR".
+        contcar_name: name of the CONTCAR file. Defaults to "CONTCAR".
+        collect_mag_data: if True, collect the magnetization data using extract_tot_mag_data. Defaults to
+        False.
+        magmom_tolerance: the tolerance for the total magnetic moment to be considered zero. Defaults to 0.
+
+    Yields:
+        pandas DataFrame: a batch of rows with the same columns as extract_configuration_data
+    """
+
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    df_list = []
+    number_of_rows = 0
+    for config_dir in config_dirs:
+        try:
+            config_df = extract_configuration_data(
+                config_dir,
+                outcar_name=outcar_name,
+                oszicar_name=oszicar_name,
+                contcar_name=contcar_name,
+                collect_mag_data=collect_mag_data,
+                magmom_tolerance=magmom_tolerance,
+                total_magnetic_moment_tolerance=total_magnetic_moment_tolerance,
+            )
+        except Exception as e:
+            print(f"Error in {config_dir}: {e}")
+            continue
+        if config_df.empty:
+            continue
+
+        if "mag_data" in config_df.columns:
+            config_df["magmoms"] = [
+                mag_data["tot"].tolist() for mag_data in config_df["mag_data"]
+            ]
+            config_df = config_df.drop(columns=["mag_data"])
+
+        df_list.append(config_df)
+        number_of_rows += len(config_df)
+        if number_of_rows >= batch_size:
+            yield pd.concat(df_list, ignore_index=True)
+            df_list = []
+            number_of_rows = 0
+
+    if df_list:
+        yield pd.concat(df_list, ignore_index=True)
+
+
+def write_configuration_data_parquet(
+    config_dirs: list[str],
+    dataset_path: str,
+    batch_size: int = 1000,
+    config_prefix_length: int = 1,
+    overwrite: bool = False,
+    **kwargs,
+) -> int:
+    """Extracts the configuration data from multiple config directories and writes it to a Parquet dataset
+    partitioned by config prefix. Only one batch is held in memory at a time. Requires pyarrow.
+
+    A dataset is always written from scratch: the files of an earlier run would otherwise be read back together
+    with the new ones by read_configuration_data_parquet, so a non-empty dataset_path is refused unless overwrite
+    is True, in which case it is deleted first.
+
+    Args:
+        config_dirs: list of paths to config directories that will be passed to extract_configuration_data()
+        dataset_path: path to the directory of the Parquet dataset. Created if it does not exist.
+        batch_size: number of rows written per batch. Defaults to 1000.
+        config_prefix_length: number of leading characters of the config name used as the partition key.
+        Defaults to 1.
+        overwrite: delete an existing, non-empty dataset_path before writing. Defaults to False.
+        **kwargs: passed to iter_configuration_data (file names, collect_mag_data and tolerances)
+
+    Raises:
+        ValueError: if config_prefix_length is smaller than 1
+        FileExistsError: if dataset_path is not empty and overwrite is False
+
+    Returns:
+        int: the number of rows written
+    """
+
+    pa, pq = _import_pyarrow()
+
+    if config_prefix_length < 1:
+        raise ValueError("config_prefix_length must be a positive integer")
+    if os.path.isdir(dataset_path) and os.listdir(dataset_path):
+        if not overwrite:
+            raise FileExistsError(
+                f"{dataset_path} is not empty, pass overwrite=True to replace the dataset"
+            )
+        shutil.rmtree(dataset_path)
+
+    number_of_rows = 0
+    for batch_number, batch_df in enumerate(
+        iter_configuration_data(config_dirs, batch_size=batch_size, **kwargs)
+    ):
+        batch_df["config_prefix"] = batch_df["config"].str[:config_prefix_length]
+        table = pa.Table.from_pandas(batch_df, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            root_path=dataset_path,
+            partition_cols=["config_prefix"],
+            basename_template=f"batch_{batch_number}_{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        number_of_rows += len(batch_df)
+    return number_of_rows
+
+
+def read_configuration_data_parquet(
+    dataset_path: str,
+    columns: list[str] = None,
+    config_prefixes: list[str] = None,
+) -> pd.DataFrame:
+    """Reads a Parquet dataset written by write_configuration_data_parquet. Only the requested columns and
+    partitions are loaded. Requires pyarrow.
+
+    Args:
+        dataset_path: path to the directory of the Parquet dataset
+        columns: columns to load. Defaults to None, which loads all columns.
+        config_prefixes: config prefixes (partitions) to load. Defaults to None, which loads all partitions.
+
+    Returns:
+        pandas DataFrame: the configuration data without the config_prefix partition column
+    """
+
+    pa, _ = _import_pyarrow()
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        pa.schema([("config_prefix", pa.string())]), flavor="hive"
+    )
+    filters = None
+    if config_prefixes is not None:
+        filters = [("config_prefix", "in", [str(prefix) for prefix in config_prefixes])]
+
+    df = pd.read_parquet(
+        dataset_path,
+        engine="pyarrow",
+        columns=columns,
+        filters=filters,
+        partitioning=partitioning,
+    )
+    if "config_prefix" in df.columns and (
+        columns is None or "config_prefix" not in columns
+    ):
+        df = df.drop(columns=["config_prefix"])
+    return df
+
+
+def _concat_mag_tables(mag_table_list: list[pd.DataFrame]) -> pd.DataFrame:
+    mag_table_list = [mag_table for mag_table in mag_table_list if not mag_table.empty]
+    if not mag_table_list:
+        return pd.DataFrame(columns=["config", "volume", "ion", "tot"])
+    return format_mag_table(pd.concat(mag_table_list, ignore_index=True))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for Parquet support. Install it with 'pip install dfttk2[parquet]'"
+        ) from e
+    return pa, pq
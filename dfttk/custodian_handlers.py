@@ -0,0 +1,146 @@
+"""
+Custodian handlers for dfttk workflows. They can be added to the handlers list of workflows.three_step_relaxation and
+workflows.ev_curve_series together with the custodian VASP handlers.
+"""
+
+# Standard library imports
+import json
+import os
+
+# Local application/library specific imports
+from custodian.custodian import ErrorHandler
+
+# DFTTK imports
+from dfttk.data_extraction import new_mag_reader, update_mag_reader, mag_reader_to_df
+from dfttk.magnetism import significant_magmom_changes
+
+
+class MagneticMomentChangeHandler(ErrorHandler):
+    """Monitor that stops a VASP run once the magnetic moment of any ion has moved outside its tolerance of the
+    input MAGMOM, e.g. because the moments collapsed or flipped and the magnetic ordering changed.
+
+    The OUTCAR is read incrementally: each check only reads the lines written since the previous check. The
+    moments of the last complete magnetization block are compared with the input MAGMOM using the same tolerances
+    as magnetism.significant_magmom_change.
+
+    When a change is detected the run is stopped, a marker file with the changed ions is written to the run
+    directory and custodian raises a NonRecoverableError, so the remaining steps of three_step_relaxation and the
+    remaining volumes of ev_curve_series are not run.
+    """
+
+    is_monitor = True
+
+    def __init__(
+        self,
+        magmom_tol: float | tuple[float, float] | dict = 0.5,
+        output_filename: str = "OUTCAR",
+        stop_method: str = "stopcar",
+        marker_filename: str = "magmom_changed.json",
+    ) -> None:
+        """
+        Args:
+            magmom_tol: tolerance for the change in magnetic moment of each ion, see
+            magnetism.significant_magmom_change. Defaults to 0.5.
+            output_filename: name of the OUTCAR file. Defaults to "OUTCAR".
+            stop_method: "stopcar" writes a STOPCAR with LABORT = .TRUE. so VASP stops at the next electronic
+            step, "kill" lets custodian terminate the job. Defaults to "stopcar".
+            marker_filename: name of the marker file written to the run directory. Defaults to
+            "magmom_changed.json".
+
+        Raises:
+            ValueError: if stop_method is not "stopcar" or "kill"
+        """
+
+        if stop_method not in ["stopcar", "kill"]:
+            raise ValueError('stop_method must be "stopcar" or "kill"')
+        self.magmom_tol = magmom_tol
+        self.output_filename = output_filename
+        self.stop_method = stop_method
+        self.marker_filename = marker_filename
+        self.is_terminating = stop_method == "kill"
+        self._reset()
+
+    def check(self, directory: str = "./") -> bool:
+        """Reads the new OUTCAR lines and checks the last complete magnetization block.
+
+        Args:
+            directory: run directory. Defaults to "./".
+
+        Returns:
+            bool: True once the moments have been outside the tolerance in the current run. It stays True because
+            custodian only keeps the result of the last monitor check.
+        """
+
+        outcar_path = os.path.join(directory, self.output_filename)
+        if not os.path.isfile(outcar_path):
+            return False
+
+        # A new run (e.g. the next step of three_step_relaxation) starts a new OUTCAR
+        stat = os.stat(outcar_path)
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reset()
+            self._inode = stat.st_ino
+        if self._detected or stat.st_size == self._offset:
+            return self._detected
+
+        with open(outcar_path, "rb") as file:
+            file.seek(self._offset)
+            new_data = file.read()
+        complete_data = new_data[: new_data.rfind(b"\n") + 1]
+        self._offset += len(complete_data)
+        update_mag_reader(
+            self._reader, complete_data.decode(errors="replace").splitlines(keepends=True)
+        )
+
+        if (
+            self._reader["number_of_steps"] == self._checked_steps
+            or self._reader["input_magmoms"] is None
+        ):
+            return False
+        self._checked_steps = self._reader["number_of_steps"]
+
+        mag_data = mag_reader_to_df(self._reader)
+        changed = significant_magmom_changes(mag_data, self.magmom_tol)
+        if changed.any():
+            self._detected = True
+            self._changed_ions = mag_data[changed]
+            return True
+        return False
+
+    def correct(self, directory: str = "./") -> dict:
+        """Stops the run and writes the marker file. No correction is possible, so custodian stops.
+
+        Args:
+            directory: run directory. Defaults to "./".
+
+        Returns:
+            dict: errors and (no) actions
+        """
+
+        if self._corrected:
+            return {"errors": ["Magnetic moments changed"], "actions": None}
+        self._corrected = True
+
+        if self.stop_method == "stopcar":
+            with open(os.path.join(directory, "STOPCAR"), "w") as file:
+                file.write("LABORT = .TRUE.\n")
+
+        marker = {
+            "step": self._checked_steps,
+            "changed_ions": self._changed_ions["#_of_ion"].tolist(),
+            "input_magmoms": self._changed_ions["input_tot"].tolist(),
+            "magmoms": self._changed_ions["tot"].tolist(),
+        }
+        with open(os.path.join(directory, self.marker_filename), "w") as file:
+            json.dump(marker, file)
+
+        return {"errors": ["Magnetic moments changed"], "actions": None}
+
+    def _reset(self) -> None:
+        self._reader = new_mag_reader()
+        self._offset = 0
+        self._inode = None
+        self._checked_steps = 0
+        self._detected = False
+        self._corrected = False
+        self._changed_ions = None
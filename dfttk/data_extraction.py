@@ -181,6 +181,22 @@ def extract_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
         return df
 
 
+def extract_last_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
+    """Returns the magnetization data (all orbital columns) of the last step for each ion.
+
+    Args:
+        outcar_path: Path to an OUTCAR file. Defaults to "OUTCAR".
+
+    Returns:
+        a pandas DataFrame with the '#_of_ion' column followed by the orbital columns (e.g. 's', 'p', 'd', 'tot')
+    """
+
+    all_mag_data = extract_mag_data(outcar_path)
+    last_step_data = all_mag_data[all_mag_data["step"] == all_mag_data["step"].max()]
+    last_step_data = last_step_data.drop(columns=["step"]).reset_index(drop=True)
+    return last_step_data
+
+
 # TODO just get mag data for all the ions
 def extract_tot_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
     """Returns only the 'tot' magnetization of the last step for each specified ion.
@@ -192,12 +208,52 @@ def extract_tot_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
         a pandas DataFrame containing the 'tot' magnetization data
     """
 
-    all_mag_data = extract_mag_data(outcar_path)
-    last_step_data = all_mag_data[all_mag_data["step"] == all_mag_data["step"].max()]
-    tot_data = last_step_data[["#_of_ion", "tot"]]
-    tot_data.reset_index(drop=True, inplace=True)
+    tot_data = extract_last_mag_data(outcar_path)[["#_of_ion", "tot"]]
     return tot_data
 
+
+def format_mag_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Formats per-ion magnetization data as a long table with one row per (config, volume, ion).
+    The ion column is int32 and the orbital columns (s, p, d, ..., tot) are float32. The config and volume
+    columns are kept as they are so they can be used as join keys with extract_configuration_data rows.
+    An optional 'species' column (element of each ion) is kept after the ion column.
+
+    Args:
+        df: DataFrame with 'config', 'volume', '#_of_ion' (or 'ion') and orbital columns
+
+    Returns:
+        pd.DataFrame: with columns 'config', 'volume', 'ion', ('species') followed by the orbital columns
+    """
+
+    df = df.rename(columns={"#_of_ion": "ion"})
+    key_columns = [
+        column for column in ["config", "volume", "ion", "species"] if column in df.columns
+    ]
+    orbital_columns = [column for column in df.columns if column not in key_columns]
+    mag_table = df[key_columns + orbital_columns].astype(
+        {"ion": np.int32, **{column: np.float32 for column in orbital_columns}}
+    )
+    return mag_table.reset_index(drop=True)
+
+
+def mag_data_to_mag_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts a DataFrame with a nested 'mag_data' DataFrame in each row (as returned by
+    extract_configuration_data with collect_mag_data=True) to a long magnetization table.
+
+    Args:
+        df: DataFrame with 'config', 'volume' and 'mag_data' columns
+
+    Returns:
+        pd.DataFrame: long magnetization table, see format_mag_table
+    """
+
+    lengths = [len(mag_data) for mag_data in df["mag_data"]]
+    mag_df = pd.concat(list(df["mag_data"]), ignore_index=True)
+    mag_df.insert(0, "config", np.repeat(df["config"].to_numpy(), lengths))
+    mag_df.insert(1, "volume", np.repeat(df["volume"].to_numpy(), lengths))
+    return format_mag_table(mag_df)
+
+
 def parse_magmom_line(line: str) -> pd.DataFrame:
     """reads vasp formatted MAGMOM line from an INCAR or OUTCAR
 
@@ -245,6 +301,117 @@ def extract_input_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
             if "MAGMOM" in caps_line:
                 return parse_magmom_line(line)
         raise ValueError("No MAGMOM line found in OUTCAR")
-                
 
 
+def extract_input_and_tot_mag_data(outcar_path: str = "OUTCAR") -> pd.DataFrame:
+    """Reads the input magnetic moments (first MAGMOM line, as in extract_input_mag_data), the 'tot' magnetic
+    moments of the last step (as in extract_tot_mag_data) and the species of each ion from an OUTCAR in a
+    single pass.
+
+    Args:
+        outcar_path: path to the OUTCAR. Defaults to "OUTCAR".
+
+    Raises:
+        ValueError: if there is no line that contains MAGMOM (non magnetic calculation) or no magnetization data.
+
+    Returns:
+        pd.DataFrame: with columns '#_of_ion', 'species', 'input_tot' and 'tot'. 'species' is None if the OUTCAR
+        has no VRHFIN and 'ions per type' lines.
+    """
+
+    reader = new_mag_reader()
+    with open(outcar_path, "r") as file:
+        update_mag_reader(reader, file)
+    return mag_reader_to_df(reader)
+
+
+def new_mag_reader() -> dict:
+    """Returns the empty state used by update_mag_reader to read the magnetization data of an OUTCAR
+    incrementally, e.g. while VASP is still writing it.
+
+    Returns:
+        dict: reader state
+    """
+
+    return {
+        "input_magmoms": None,
+        "species_types": [],
+        "ions_per_type": None,
+        "block": None,
+        "last_block": None,
+        "tot_column": -1,
+        "number_of_steps": 0,
+    }
+
+
+def update_mag_reader(reader: dict, lines) -> dict:
+    """Reads OUTCAR lines into a reader state from new_mag_reader. Lines must be complete and passed in order,
+    but can be split over any number of calls.
+
+    Args:
+        reader: reader state from new_mag_reader
+        lines: iterable of OUTCAR lines
+
+    Returns:
+        dict: the updated reader state. 'number_of_steps' counts the complete magnetization blocks.
+    """
+
+    for line in lines:
+        if reader["block"] is not None:
+            if "# of ion" in line:
+                reader["tot_column"] = line.split()[3:].index("tot") + 1
+            elif "----" in line:
+                if reader["block"]:
+                    reader["last_block"] = reader["block"]
+                    reader["block"] = None
+                    reader["number_of_steps"] += 1
+            elif line.strip():
+                parts = line.split()
+                reader["block"].append((int(parts[0]), float(parts[reader["tot_column"]])))
+        elif "magnetization (x)" in line:
+            reader["block"] = []
+        elif reader["input_magmoms"] is None and "MAGMOM" in line.upper():
+            reader["input_magmoms"] = parse_magmom_line(line)["tot"].to_numpy()
+        elif "VRHFIN" in line:
+            reader["species_types"].append(line.split("=")[1].split(":")[0].strip())
+        elif "ions per type" in line:
+            reader["ions_per_type"] = [int(n) for n in line.split("=")[1].split()]
+    return reader
+
+
+def mag_reader_to_df(reader: dict) -> pd.DataFrame:
+    """Returns the input and last 'tot' magnetic moments read so far by update_mag_reader.
+
+    Args:
+        reader: reader state from update_mag_reader
+
+    Raises:
+        ValueError: if there is no line that contains MAGMOM (non magnetic calculation) or no magnetization data.
+
+    Returns:
+        pd.DataFrame: see extract_input_and_tot_mag_data
+    """
+
+    input_magmoms = reader["input_magmoms"]
+    ions_per_type = reader["ions_per_type"]
+    species_types = reader["species_types"]
+    if input_magmoms is None:
+        raise ValueError("No MAGMOM line found in OUTCAR")
+    if reader["last_block"] is None:
+        raise ValueError("No magnetization data found in OUTCAR")
+
+    ions, tot = zip(*reader["last_block"])
+    if len(input_magmoms) < len(ions):
+        raise ValueError("The MAGMOM line has fewer magnetic moments than there are ions")
+    if ions_per_type is not None and len(species_types) >= len(ions_per_type):
+        species = np.repeat(species_types[: len(ions_per_type)], ions_per_type)
+    else:
+        species = None
+    return pd.DataFrame(
+        {
+            "#_of_ion": ions,
+            "species": species,
+            "input_tot": input_magmoms[: len(ions)],
+            "tot": tot,
+        }
+    )
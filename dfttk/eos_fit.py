@@ -16,8 +16,12 @@ and 4-parameter Morse.
 """
 
 # Standard library imports
+import collections
+import concurrent.futures
+import hashlib
+import json
 import os
-import sys
+import pickle
 
 # Related third party imports
 import numpy as np
@@ -25,12 +29,190 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from distinctipy import get_colors
-from scipy.optimize import fsolve, curve_fit
+from scipy.optimize import curve_fit
+
+# DFTTK imports
+from dfttk.data_extraction import mag_data_to_mag_table
 
 # Conversion factor
 EV_PER_CUBIC_ANGSTROM_TO_GPA = 160.21766208  # 1 eV/Å^3  = 160.21766208 GPa
 
 
+def power_basis(volume: float | np.ndarray, exponents: list[float]) -> np.ndarray:
+    """Basis of the mBM and BM EOS, which are linear in their coefficients: one column volume**exponent per
+    coefficient.
+
+    Args:
+        volume (float | np.ndarray): volume data
+        exponents (list[float]): exponent of each coefficient, e.g. [0, -1/3, -2/3, -1] for mBM4
+
+    Returns:
+        np.ndarray: basis with shape volume.shape + (len(exponents),)
+    """
+
+    return np.asarray(volume, dtype=float)[..., None] ** np.asarray(exponents, dtype=float)
+
+
+def log_basis(volume: float | np.ndarray, number_of_coefficients: int) -> np.ndarray:
+    """Basis of the LOG EOS: one column ln(volume)**k per coefficient, k = 0, 1, ...
+
+    Args:
+        volume (float | np.ndarray): volume data
+        number_of_coefficients (int): 4 for LOG4, 5 for LOG5
+
+    Returns:
+        np.ndarray: basis with shape volume.shape + (number_of_coefficients,)
+    """
+
+    return np.log(np.asarray(volume, dtype=float))[..., None] ** np.arange(number_of_coefficients)
+
+
+LINEAR_EOS_EXPONENTS = {
+    "mBM4": [0, -1 / 3, -2 / 3, -1],
+    "mBM5": [0, -1 / 3, -2 / 3, -1, -4 / 3],
+    "BM4": [0, -2 / 3, -4 / 3, -2],
+    "BM5": [0, -2 / 3, -4 / 3, -2, -8 / 3],
+}
+LINEAR_EOS = ["mBM4", "mBM5", "BM4", "BM5", "LOG4", "LOG5"]
+NONLINEAR_EOS = ["murnaghan", "vinet", "morse"]
+# Goodness-of-fit columns of fit_eos_batch
+FIT_STATISTICS = ["RMS", "AIC", "BIC", "LOO_RMS"]
+
+
+def linear_eos_basis(eos_name: str, volume: float | np.ndarray) -> np.ndarray:
+    """Basis of one of the EOS that are linear in their coefficients.
+
+    Args:
+        eos_name (str): one of LINEAR_EOS
+        volume (float | np.ndarray): volume data
+
+    Raises:
+        ValueError: if eos_name is not one of LINEAR_EOS
+
+    Returns:
+        np.ndarray: basis with shape volume.shape + (number_of_coefficients,)
+    """
+
+    if eos_name in LINEAR_EOS_EXPONENTS:
+        return power_basis(volume, LINEAR_EOS_EXPONENTS[eos_name])
+    if eos_name in ["LOG4", "LOG5"]:
+        return log_basis(volume, int(eos_name[-1]))
+    raise ValueError(f"eos_name must be one of {LINEAR_EOS}")
+
+
+def equilibrium_volume(
+    eos_name: str, coefficients: list, reference_volume: float | np.ndarray
+) -> float | np.ndarray:
+    """Equilibrium volume of the EOS that are linear in their coefficients, for any number of fits at once.
+
+    Each of these EOS is a polynomial in x = V**(-1/3) (mBM), x = V**(-2/3) (BM) or x = ln(V) (LOG), so dE/dV = 0
+    where the polynomial dE/dx = b + 2c x + 3d x**2 (+ 4e x**3) has a root. The roots are the eigenvalues of the
+    companion matrix. Of the real roots that give a positive volume, the energy minima are preferred, and among
+    them the volume closest to reference_volume (e.g. the middle of the fitted volume range) is returned.
+
+    Args:
+        eos_name (str): one of LINEAR_EOS
+        coefficients (list): a, b, c, d(, e), each a float or an array of the same shape
+        reference_volume (float | np.ndarray): volume used to choose between roots, broadcast to the coefficients
+
+    Raises:
+        ValueError: if eos_name is not one of LINEAR_EOS
+
+    Returns:
+        float | np.ndarray: V0, NaN where the derivative has no suitable root
+    """
+
+    if eos_name not in LINEAR_EOS:
+        raise ValueError(f"eos_name must be one of {LINEAR_EOS}")
+    *coefficients, reference_volume = np.broadcast_arrays(
+        *[np.asarray(coefficient, dtype=float) for coefficient in coefficients],
+        np.asarray(reference_volume, dtype=float),
+    )
+    shape = reference_volume.shape
+    coefficients = np.column_stack([coefficient.ravel() for coefficient in coefficients])
+    reference_volume = reference_volume.ravel()
+
+    # dE/dx and d2E/dx2 in increasing powers of x
+    powers = np.arange(coefficients.shape[1])
+    derivative = (coefficients * powers)[:, 1:]
+    derivative2 = (derivative * powers[:-1])[:, 1:]
+    roots = _polynomial_roots(derivative)
+
+    x = roots.real
+    is_real = np.abs(roots.imag) <= 1e-8 * np.maximum(np.abs(roots), 1)
+    with np.errstate(all="ignore"):
+        if eos_name.startswith("mBM"):
+            volumes = x ** (-3.0)
+        elif eos_name.startswith("BM"):
+            volumes = x ** (-1.5)
+        else:
+            volumes = np.exp(x)
+        is_valid = is_real & np.isfinite(volumes) & (volumes > 0)
+        curvature = np.sum(
+            derivative2[:, None, :] * x[..., None] ** np.arange(derivative2.shape[1]),
+            axis=2,
+        )
+        distance = np.abs(np.log(volumes / reference_volume[:, None]))
+
+    # Minima first, then the root closest to the reference volume
+    penalty = np.where(curvature > 0, 0.0, 1e6)
+    score = np.where(is_valid, distance + penalty, np.inf)
+    best = np.argmin(score, axis=1)
+    rows = np.arange(len(score))
+    found = np.isfinite(score[rows, best])
+    V0 = np.full(len(score), np.nan)
+    V0[found] = volumes[rows[found], best[found]]
+
+    V0 = V0.reshape(shape)
+    return V0[()] if V0.ndim == 0 else V0
+
+
+def _polynomial_roots(coefficients: np.ndarray) -> np.ndarray:
+    # Complex roots of each row of polynomial coefficients in increasing powers, from the stacked eigenvalues of the
+    # companion matrices. Rows with a lower degree or non-finite coefficients are padded with NaN.
+    number_of_polynomials, number_of_coefficients = coefficients.shape
+    roots = np.full(
+        (number_of_polynomials, number_of_coefficients - 1), np.nan, dtype=complex
+    )
+    nonzero = coefficients != 0
+    degree = np.where(
+        nonzero.any(axis=1),
+        number_of_coefficients - 1 - np.argmax(nonzero[:, ::-1], axis=1),
+        0,
+    )
+    degree[~np.isfinite(coefficients).all(axis=1)] = 0
+    for n in range(1, number_of_coefficients):
+        rows = np.flatnonzero(degree == n)
+        if not len(rows):
+            continue
+        monic = coefficients[rows, :n] / coefficients[rows, n, None]
+        companion = np.zeros((len(rows), n, n))
+        companion[:, np.arange(1, n), np.arange(n - 1)] = 1
+        companion[:, :, -1] = -monic
+        roots[rows, :n] = np.linalg.eigvals(companion)
+    return roots
+
+
+def linear_least_squares(basis: np.ndarray, energy: float | np.ndarray) -> np.ndarray:
+    """Solves for the coefficients of an EOS that is linear in its coefficients. The columns of the basis are
+    scaled to unit norm before the solve, which keeps the fit well conditioned for the V**(-k/3) powers.
+
+    Args:
+        basis (np.ndarray): basis from power_basis or log_basis, shape (number_of_volumes, number_of_coefficients)
+        energy (float | np.ndarray): energy data
+
+    Returns:
+        np.ndarray: coefficients a, b, c, ...
+    """
+
+    scale = np.linalg.norm(basis, axis=0)
+    scale[scale == 0] = 1
+    coefficients = np.linalg.lstsq(
+        basis / scale, np.asarray(energy, dtype=float), rcond=None
+    )[0]
+    return coefficients / scale
+
+
 # mBM4 EOS Functions
 def mBM4_equation(
     volume: float | np.ndarray, a: float, b: float, c: float, d: float
@@ -156,7 +338,7 @@ def mBM4(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d = curve_fit(mBM4_equation, volume, energy, p0=[100, 100, 100, 100])[0]
+    a, b, c, d = linear_least_squares(linear_eos_basis("mBM4", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = mBM4_equation(volume_range, a, b, c, d)
@@ -170,6 +352,24 @@ def mBM4(
     return eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos
 
 
+def mBM4_initial_guess(
+    volume: float | np.ndarray, energy: float | np.ndarray
+) -> list[float]:
+    """Initial guess of V0, E0, B (eV/Å^3) and BP for the nonlinear EOS fits, from the linear mBM4 fit.
+
+    Args:
+        volume (float | np.ndarray): volume data
+        energy (float | np.ndarray): energy data
+
+    Returns:
+        list[float]: V0, E0, B, BP
+    """
+
+    a, b, c, d = linear_least_squares(linear_eos_basis("mBM4", volume), energy)
+    V0, E0, B, BP, _ = mBM4_eos_parameters(a, b, c, d)
+    return [V0, E0, B / EV_PER_CUBIC_ANGSTROM_TO_GPA, BP]
+
+
 # mBM5 EOS Functions
 def mBM5_equation(
     volume: float | np.ndarray, a: float, b: float, c: float, d: float, e: float
@@ -254,7 +454,8 @@ def mBM5_eos_parameters(
     """Calculate V0, E0, B, BP, and B2P from a, b, c, d, and e.
 
     Args:
-        volume_range (np.ndarray): range of volumes
+        volume_range (np.ndarray): range of volumes, V0 is the energy minimum closest to its middle. An array of
+        shape (n, 2) with the smallest and largest volume of n fits is also accepted, with arrays of coefficients.
         a (float): a-parameter
         b (float): b-parameter
         c (float): c-parameter
@@ -265,7 +466,9 @@ def mBM5_eos_parameters(
         tuple[float, float, float, float, float]: V0, E0, B, BP, B2P
     """
 
-    V0 = fsolve(mBM5_derivative, np.mean(volume_range), args=(b, c, d, e))[0]
+    V0 = equilibrium_volume(
+        "mBM5", [a, b, c, d, e], np.mean(volume_range, axis=-1)
+    )
     E0 = mBM5_equation(V0, a, b, c, d, e)
     B = (
         (28 * e) / (9 * V0 ** (10 / 3))
@@ -304,9 +507,7 @@ def mBM5(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d, e = curve_fit(
-        mBM5_equation, volume, energy, p0=[100, 100, 100, 100, 100]
-    )[0]
+    a, b, c, d, e = linear_least_squares(linear_eos_basis("mBM5", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = mBM5_equation(volume_range, a, b, c, d, e)
@@ -448,7 +649,7 @@ def BM4(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d = curve_fit(BM4_equation, volume, energy, p0=[100, 100, 100, 100])[0]
+    a, b, c, d = linear_least_squares(linear_eos_basis("BM4", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = BM4_equation(volume_range, a, b, c, d)
@@ -546,7 +747,8 @@ def BM5_eos_parameters(
     """Calculate V0, E0, B, BP, and B2P from a, b, c, d, and e.
 
     Args:
-        volume_range (np.ndarray): range of volumes
+        volume_range (np.ndarray): range of volumes, V0 is the energy minimum closest to its middle. An array of
+        shape (n, 2) with the smallest and largest volume of n fits is also accepted, with arrays of coefficients.
         a (float): a-parameter
         b (float): b-parameter
         c (float): c-parameter
@@ -557,7 +759,9 @@ def BM5_eos_parameters(
         tuple[float, float, float, float, float]: V0, E0, B, BP, B2P
     """
 
-    V0 = fsolve(BM5_derivative, np.mean(volume_range), args=(b, c, d, e))[0]
+    V0 = equilibrium_volume(
+        "BM5", [a, b, c, d, e], np.mean(volume_range, axis=-1)
+    )
     E0 = BM5_equation(V0, a, b, c, d, e)
     B = (
         2 * (44 * e + 27 * d * V0 ** (2 / 3) + 14 * c * V0 ** (4 / 3) + 5 * b * V0**2)
@@ -595,9 +799,7 @@ def BM5(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d, e = curve_fit(
-        BM5_equation, volume, energy, p0=[100, 100, 100, 100, 100]
-    )[0]
+    a, b, c, d, e = linear_least_squares(linear_eos_basis("BM5", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = BM5_equation(volume_range, a, b, c, d, e)
@@ -682,6 +884,8 @@ def LOG4_eos_parameters(
     """Calculate V0, E0, B, BP, and B2P from a, b, c, and d.
 
     Args:
+        volume_range (np.ndarray): range of volumes, V0 is the energy minimum closest to its middle. An array of
+        shape (n, 2) with the smallest and largest volume of n fits is also accepted, with arrays of coefficients.
         a (float): a-parameter
         b (float): b-parameter
         c (float): c-parameter
@@ -691,7 +895,9 @@ def LOG4_eos_parameters(
         tuple[float, float, float, float, float]: V0, E0, B, BP, B2P
     """
 
-    V0 = fsolve(LOG4_derivative, np.mean(volume_range), args=(b, c, d))[0]
+    V0 = equilibrium_volume(
+        "LOG4", [a, b, c, d], np.mean(volume_range, axis=-1)
+    )
     E0 = LOG4_equation(V0, a, b, c, d)
     B = -((b - 2 * c + 2 * (c - 3 * d) * np.log(V0) + 3 * d * np.log(V0) ** 2) / V0)
     B = B * EV_PER_CUBIC_ANGSTROM_TO_GPA
@@ -727,7 +933,7 @@ def LOG4(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d = curve_fit(LOG4_equation, volume, energy, p0=[100, 100, 100, 100])[0]
+    a, b, c, d = linear_least_squares(linear_eos_basis("LOG4", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = LOG4_equation(volume_range, a, b, c, d)
@@ -825,7 +1031,8 @@ def LOG5_eos_parameters(
     """Calculate V0, E0, B, BP, and B2P from a, b, c, d, and e.
 
     Args:
-        volume_range (np.ndarray): range of volumes
+        volume_range (np.ndarray): range of volumes, V0 is the energy minimum closest to its middle. An array of
+        shape (n, 2) with the smallest and largest volume of n fits is also accepted, with arrays of coefficients.
         a (float): a-parameter
         b (float): b-parameter
         c (float): c-parameter
@@ -836,7 +1043,9 @@ def LOG5_eos_parameters(
         tuple[float, float, float, float, float]: V0, E0, B, BP, B2P
     """
 
-    V0 = fsolve(LOG5_derivative, np.mean(volume_range), args=(b, c, d, e))[0]
+    V0 = equilibrium_volume(
+        "LOG5", [a, b, c, d, e], np.mean(volume_range, axis=-1)
+    )
     E0 = LOG5_equation(V0, a, b, c, d, e)
 
     B = -(
@@ -902,9 +1111,7 @@ def LOG5(
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
     """
 
-    a, b, c, d, e = curve_fit(
-        LOG5_equation, volume, energy, p0=[100, 100, 100, 100, 100]
-    )[0]
+    a, b, c, d, e = linear_least_squares(linear_eos_basis("LOG5", volume), energy)
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
     energy_eos = LOG5_equation(volume_range, a, b, c, d, e)
@@ -962,6 +1169,33 @@ def murnaghan_derivative(
     return energy_derivative
 
 
+def murnaghan_jacobian(
+    volume: float | np.ndarray, V0: float, E0: float, B: float, BP: float
+) -> np.ndarray:
+    """Jacobian of the Murnaghan EOS with respect to (V0, E0, B, BP)
+
+    Args:
+        volume (float | np.ndarray): input volume
+        V0 (float): equilibrium volume
+        E0 (float): equilibrium energy
+        B (float): bulk modulus
+        BP (float): derivative of bulk modulus with respect to pressure
+
+    Returns:
+        np.ndarray: derivatives with shape volume.shape + (4,)
+    """
+
+    x = (V0 / volume) ** BP
+    dE_dV0 = B / (BP - 1) * (volume * x / V0 - 1)
+    dE_dB = -V0 / (BP - 1) + (volume / BP) * (1 + x / (BP - 1))
+    dE_dBP = B * V0 / (BP - 1) ** 2 + B * volume * (
+        -1 / BP**2
+        + x * np.log(V0 / volume) / (BP * (BP - 1))
+        - x * (2 * BP - 1) / (BP * (BP - 1)) ** 2
+    )
+    return np.stack(np.broadcast_arrays(dE_dV0, 1.0, dE_dB, dE_dBP), axis=-1)
+
+
 def murnaghan(
     volume: float | np.ndarray, energy: float | np.ndarray
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
@@ -977,17 +1211,13 @@ def murnaghan(
 
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
-    [eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos] = mBM4(
-        volume, energy
-    )
-    initial_guess = [
-        eos_parameters[0],
-        eos_parameters[1],
-        eos_parameters[2] / EV_PER_CUBIC_ANGSTROM_TO_GPA,
-        eos_parameters[3],
-    ]
-
-    V0, E0, B, BP = curve_fit(murnaghan_equation, volume, energy, p0=initial_guess)[0]
+    V0, E0, B, BP = curve_fit(
+        murnaghan_equation,
+        volume,
+        energy,
+        p0=mBM4_initial_guess(volume, energy),
+        jac=murnaghan_jacobian,
+    )[0]
 
     energy_eos = murnaghan_equation(volume_range, V0, E0, B, BP)
     eos_parameters = np.array([V0, E0, B * EV_PER_CUBIC_ANGSTROM_TO_GPA, BP, 0])
@@ -1052,6 +1282,34 @@ def vinet_derivative(volume: float | np.ndarray, V0, B, BP) -> float | np.ndarra
     return energy_derivative
 
 
+def vinet_jacobian(
+    volume: float | np.ndarray, V0: float, E0: float, B: float, BP: float
+) -> np.ndarray:
+    """Jacobian of the Vinet EOS with respect to (V0, E0, B, BP)
+
+    Args:
+        volume (float | np.ndarray): input volume
+        V0 (float): equilibrium volume
+        E0 (float): equilibrium energy
+        B (float): bulk modulus
+        BP (float): derivative of bulk modulus with respect to pressure
+
+    Returns:
+        np.ndarray: derivatives with shape volume.shape + (4,)
+    """
+
+    # energy = E0 + K * (1 - (1 - y) * exp(y))
+    eta = (volume / V0) ** (1 / 3)
+    y = 3 / 2 * (BP - 1) * (1 - eta)
+    K = (4 * B * V0) / (BP - 1) ** 2
+    G = 1 - (1 - y) * np.exp(y)
+    dE_dy = K * y * np.exp(y)
+    dE_dV0 = G * K / V0 + dE_dy * (BP - 1) * eta / (2 * V0)
+    dE_dB = G * K / B
+    dE_dBP = -2 * G * K / (BP - 1) + dE_dy * 3 / 2 * (1 - eta)
+    return np.stack(np.broadcast_arrays(dE_dV0, 1.0, dE_dB, dE_dBP), axis=-1)
+
+
 def vinet(
     volume: float | np.ndarray, energy: float | np.ndarray
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
@@ -1067,28 +1325,24 @@ def vinet(
 
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
-    [eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos] = mBM4(
-        volume, energy
-    )
-    initial_guess = [
-        eos_parameters[0],
-        eos_parameters[1],
-        eos_parameters[2] / EV_PER_CUBIC_ANGSTROM_TO_GPA,
-        eos_parameters[3],
-    ]
-
-    V0, E0, B, BP = curve_fit(vinet_equation, volume, energy, p0=initial_guess)[0]
+    V0, E0, B, BP = curve_fit(
+        vinet_equation,
+        volume,
+        energy,
+        p0=mBM4_initial_guess(volume, energy),
+        jac=vinet_jacobian,
+    )[0]
 
     energy_eos = vinet_equation(volume_range, V0, E0, B, BP)
+    pressure_eos = (
+        -1 * EV_PER_CUBIC_ANGSTROM_TO_GPA * vinet_derivative(volume_range, V0, B, BP)
+    )
 
     B2P = (19 - 18 * BP - 9 * BP**2) / (36 * B)
     B2P = B2P / EV_PER_CUBIC_ANGSTROM_TO_GPA
     B = B * EV_PER_CUBIC_ANGSTROM_TO_GPA
     eos_parameters = np.array([V0, E0, B, BP, B2P])
     eos_constants = np.array([0, 0, 0, 0, 0])
-    pressure_eos = (
-        -1 * EV_PER_CUBIC_ANGSTROM_TO_GPA * vinet_derivative(volume_range, V0, B, BP)
-    )
 
     return eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos
 
@@ -1141,6 +1395,34 @@ def morse_derivative(
     return energy_derivative
 
 
+def morse_jacobian(
+    volume: float | np.ndarray, V0: float, E0: float, B: float, BP: float
+) -> np.ndarray:
+    """Jacobian of the Morse EOS with respect to (V0, E0, B, BP)
+
+    Args:
+        volume (float | np.ndarray): input volume
+        V0 (float): equilibrium volume
+        E0 (float): equilibrium energy
+        B (float): bulk modulus
+        BP (float): derivative of bulk modulus with respect to pressure
+
+    Returns:
+        np.ndarray: derivatives with shape volume.shape + (4,)
+    """
+
+    # energy = E0 + Q / 2 * (1 - w) ** 2
+    eta = (volume / V0) ** (1 / 3)
+    w = np.exp((BP - 1) * (1 - eta))
+    Q = (9 * B * V0) / (BP - 1) ** 2
+    H = (1 - w) ** 2 / 2
+    dE_dz = -Q * (1 - w) * w
+    dE_dV0 = Q * H / V0 + dE_dz * (BP - 1) * eta / (3 * V0)
+    dE_dB = Q * H / B
+    dE_dBP = -2 * Q * H / (BP - 1) + dE_dz * (1 - eta)
+    return np.stack(np.broadcast_arrays(dE_dV0, 1.0, dE_dB, dE_dBP), axis=-1)
+
+
 def morse(
     volume: float | np.ndarray, energy: float | np.ndarray
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
@@ -1156,31 +1438,28 @@ def morse(
 
     volume_range = np.linspace(min(volume), max(volume), 1000)
 
-    [eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos] = mBM4(
-        volume, energy
-    )
-    initial_guess = [
-        eos_parameters[0],
-        eos_parameters[1],
-        eos_parameters[2] / EV_PER_CUBIC_ANGSTROM_TO_GPA,
-        eos_parameters[3],
-    ]
-
-    V0, E0, B, BP = curve_fit(morse_equation, volume, energy, p0=initial_guess)[0]
+    V0, E0, B, BP = curve_fit(
+        morse_equation,
+        volume,
+        energy,
+        p0=mBM4_initial_guess(volume, energy),
+        jac=morse_jacobian,
+    )[0]
 
     energy_eos = morse_equation(volume_range, V0, E0, B, BP)
 
-    B2P = (5 - 5 * BP - 2 * BP**2) / (9 * B)
-    B2P = B2P / EV_PER_CUBIC_ANGSTROM_TO_GPA
-    B = B * EV_PER_CUBIC_ANGSTROM_TO_GPA
-    eos_parameters = np.array([V0, E0, B, BP, B2P])
-
+    # The constants use B in eV/Å^3, as in morse_equation
     a = E0 + (9 * B * V0) / (2 * (BP - 1) ** 2)
     b = (-9 * B * V0 * np.exp(BP - 1)) / (BP - 1) ** 2
     c = (9 * B * V0 * np.exp(2 * BP - 2)) / (2 * (BP - 1) ** 2)
     d = (1 - BP) / V0 ** (1 / 3)
     eos_constants = np.array([a, b, c, d, 0])
 
+    B2P = (5 - 5 * BP - 2 * BP**2) / (9 * B)
+    B2P = B2P / EV_PER_CUBIC_ANGSTROM_TO_GPA
+    B = B * EV_PER_CUBIC_ANGSTROM_TO_GPA
+    eos_parameters = np.array([V0, E0, B, BP, B2P])
+
     pressure_eos = (
         -1 * EV_PER_CUBIC_ANGSTROM_TO_GPA * morse_derivative(volume_range, b, c, d)
     )
@@ -1188,75 +1467,200 @@ def morse(
     return eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos
 
 
-def fit_to_all_eos(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Fits the volume and energies of configurations to all EOS functions and returns the results in a dataframe.
+EOS_FUNCTIONS = {
+    "mBM4": mBM4,
+    "mBM5": mBM5,
+    "BM4": BM4,
+    "BM5": BM5,
+    "LOG4": LOG4,
+    "LOG5": LOG5,
+    "murnaghan": murnaghan,
+    "vinet": vinet,
+    "morse": morse,
+}
+EOS_FIT_CACHE_VERSION = 2
+
+
+class EOSFitCache:
+    """Content-addressed cache of EOS fits. Entries are keyed by a hash of the fitted arrays, the EOS name and the
+    fit options (see fit_cache_key), so refitting identical data is a dictionary lookup. The most recently used
+    max_entries entries are kept in memory. If a directory is given, entries are also written there as pickle
+    files and read back when they are not in memory, e.g. in a new session.
+
+    fit_eos_batch and fit_eos_cached use the module-level FIT_CACHE by default.
+    """
+
+    def __init__(self, max_entries: int = 256, directory: str = None) -> None:
+        """
+        Args:
+            max_entries (int, optional): number of entries kept in memory. Defaults to 256.
+            directory (str, optional): directory for the on-disk cache. Defaults to None, which only caches in
+            memory.
+        """
+
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str):
+        """Returns a copy of the cached value, or None if the key is not cached.
+
+        Args:
+            key (str): key from fit_cache_key
+
+        Returns:
+            the cached value or None
+        """
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_fit(self._entries[key])
+
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"{key}.pkl")
+            if os.path.isfile(path):
+                with open(path, "rb") as file:
+                    value = pickle.load(file)
+                self._store(key, value)
+                self.hits += 1
+                return _copy_fit(value)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value) -> None:
+        """Caches a copy of value.
+
+        Args:
+            key (str): key from fit_cache_key
+            value: fit result, e.g. the tuple of an EOS function or the DataFrame of fit_eos_batch
+        """
+
+        value = _copy_fit(value)
+        self._store(key, value)
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"{key}.pkl")
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                pickle.dump(value, file)
+            os.replace(temporary_path, path)
+
+    def clear(self) -> None:
+        """Removes all entries from memory and from the cache directory."""
+
+        self._entries.clear()
+        if self.directory is not None:
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, file_name))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def fit_cache_key(*arrays, **options) -> str:
+    """Hash of the data and options of a fit, used as the EOSFitCache key.
 
     Args:
-        df: Dataframe with headers ['config', 'volume', 'energy', 'number_of_atoms'].
+        *arrays: arrays that are fitted, e.g. volumes and energies
+        **options: EOS name and fit options
 
     Returns:
-        tuple(eos_df, eos_parameters_df)
+        str: hex digest
     """
 
-    eos_functions = [mBM4, mBM5, BM4, BM5, LOG4, LOG5, murnaghan, vinet, morse]
-    dataframes = []
+    digest = hashlib.sha256(f"eos_fit_cache_{EOS_FIT_CACHE_VERSION}".encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
 
-    for config in df["config"].unique():
-        config_df = df[df["config"] == config]
-        volumes = config_df["volume"].values
-        energies = config_df["energy"].values
-        number_of_atoms = config_df["number_of_atoms"].values
 
-        for eos_function in eos_functions:
-            eos_constants, eos_parameters, volume_range, energy_eos, pressure_eos = (
-                eos_function(volumes, energies)
-            )
-            eos_name = eos_function.__name__
-
-            dataframes.append(
-                pd.DataFrame(
-                    [
-                        [
-                            config,
-                            eos_name,
-                            eos_constants[0],
-                            eos_constants[1],
-                            eos_constants[2],
-                            eos_constants[3],
-                            eos_constants[4],
-                            eos_parameters[0],
-                            eos_parameters[1],
-                            eos_parameters[2],
-                            eos_parameters[3],
-                            eos_parameters[4],
-                            volume_range,
-                            energy_eos,
-                            pressure_eos,
-                            number_of_atoms,
-                        ]
-                    ],
-                    columns=[
-                        "config",
-                        "EOS",
-                        "a",
-                        "b",
-                        "c",
-                        "d",
-                        "e",
-                        "V0",
-                        "E0",
-                        "B",
-                        "BP",
-                        "B2P",
-                        "volumes",
-                        "energies",
-                        "pressures",
-                        "number_of_atoms",
-                    ],
-                )
-            )
+FIT_CACHE = EOSFitCache()
+
+
+def fit_eos_cached(
+    eos_name: str,
+    volume: float | np.ndarray,
+    energy: float | np.ndarray,
+    cache: EOSFitCache = FIT_CACHE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Fits one EOS like the EOS fitting functions (e.g. BM4), but returns the cached result if the same data has
+    been fitted before.
+
+    Args:
+        eos_name (str): one of LINEAR_EOS or NONLINEAR_EOS
+        volume (float | np.ndarray): volume data
+        energy (float | np.ndarray): energy data
+        cache (EOSFitCache, optional): Defaults to FIT_CACHE. None disables caching.
+
+    Raises:
+        ValueError: if eos_name is not known
 
-    eos_df = pd.concat(dataframes, ignore_index=True)
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: EOS parameters and the corresponding volume, energy, and pressure
+    """
+
+    if eos_name not in EOS_FUNCTIONS:
+        raise ValueError(f"eos_name must be one of {list(EOS_FUNCTIONS)}")
+    eos_function = EOS_FUNCTIONS[eos_name]
+    if cache is None:
+        return eos_function(volume, energy)
+
+    volume = np.asarray(volume, dtype=float)
+    energy = np.asarray(energy, dtype=float)
+    key = fit_cache_key(volume, energy, function="fit_eos_cached", eos_name=eos_name)
+    result = cache.get(key)
+    if result is None:
+        result = eos_function(volume, energy)
+        cache.put(key, result)
+    return result
+
+
+def _copy_fit(value):
+    # Cached values are copied in and out, so callers can modify the results they get
+    if isinstance(value, tuple):
+        return tuple(_copy_fit(element) for element in value)
+    if isinstance(value, (np.ndarray, pd.DataFrame)):
+        return value.copy()
+    return value
+
+
+def fit_to_all_eos(df: "pd.DataFrame | EVDataset") -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Fits the volume and energies of configurations to all EOS functions and returns the results in a dataframe.
+
+    The parameters, the goodness-of-fit columns (RMS, AIC, BIC, LOO_RMS and best_EOS) and the fitted volume range
+    (volume_min, volume_max) come from fit_eos_batch, so EOSModel.from_row works on the rows of both tables. eos_df adds the 1000-point volume, energy and pressure curves of every
+    (config, EOS); when only the parameters or a few curves are needed, use fit_eos_batch and EOSModel instead.
+
+    Args:
+        df: Dataframe (or EVDataset) with headers ['config', 'volume', 'energy', 'number_of_atoms']. Rows with an optional
+        boolean 'exclude' column set to True are not fitted, e.g. the volumes past a magnetic transition from
+        magnetism.exclude_magnetic_transitions.
+
+    Returns:
+        tuple(eos_df, eos_parameters_df)
+    """
+
+    df = _as_frame(df)
+    if "exclude" in df.columns:
+        df = df[~df["exclude"].fillna(False).astype(bool)]
+
+    fits = fit_eos_batch(df)
+    eos_df = _add_eos_curves(fits, df)
     eos_parameters_df = eos_df.drop(
         columns=["volumes", "energies", "pressures", "number_of_atoms"]
     )
@@ -1264,107 +1668,879 @@ def fit_to_all_eos(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     return eos_df, eos_parameters_df
 
 
-# TODO: review
-def convert_input_files_to_df(
-    input_files: list[str], left_col: str, right_col: str
+def _add_eos_curves(fits: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    # Adds the 1000-point curves and the number_of_atoms of each volume, as in the eos_df of fit_to_all_eos
+    models = [EOSModel.from_row(row) for row in fits.to_dict("records")]
+    volumes = [model.volume_range() for model in models]
+    number_of_atoms = {
+        config: values.to_numpy()
+        for config, values in df.groupby("config", sort=False)["number_of_atoms"]
+    }
+    return fits.drop(columns=["number_of_atoms"], errors="ignore").assign(
+        volumes=volumes,
+        energies=[model.evaluate(volume) for model, volume in zip(models, volumes)],
+        pressures=[model.pressure(volume) for model, volume in zip(models, volumes)],
+        number_of_atoms=[number_of_atoms[config] for config in fits["config"]],
+    )
+
+
+def pack_ev_data(
+    df: "pd.DataFrame | EVDataset",
+) -> tuple[pd.Index, np.ndarray, np.ndarray, np.ndarray]:
+    """Packs the volumes and energies of all configurations into padded 2D arrays, one row per config with the
+    volumes in ascending order. Padding entries have a volume of 1, an energy of 0 and mask False. Rows with an
+    optional boolean 'exclude' column set to True are left out, as in fit_to_all_eos.
+
+    Args:
+        df: Dataframe (or EVDataset) with headers ['config', 'volume', 'energy'].
+
+    Returns:
+        tuple(configs, volumes, energies, mask): configs in order of first appearance and arrays of shape
+        (number_of_configs, largest number of volumes)
+    """
+
+    if isinstance(df, EVDataset):
+        return df.to_arrays()
+    if "exclude" in df.columns:
+        df = df[~df["exclude"].fillna(False).astype(bool)]
+
+    codes, configs = pd.factorize(df["config"])
+    volume = df["volume"].to_numpy(dtype=float)
+    energy = df["energy"].to_numpy(dtype=float)
+    order = np.lexsort((volume, codes))
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(configs))
+    position = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    shape = (len(configs), counts.max() if len(counts) else 0)
+    volumes = np.ones(shape)
+    energies = np.zeros(shape)
+    mask = np.zeros(shape, dtype=bool)
+    volumes[codes, position] = volume[order]
+    energies[codes, position] = energy[order]
+    mask[codes, position] = True
+    return configs, volumes, energies, mask
+
+
+def fit_eos_batch(
+    df: "pd.DataFrame | EVDataset",
+    eos_names: list[str] = None,
+    max_iterations: int = 100,
+    tolerance: float = 1e-12,
+    cache: EOSFitCache = FIT_CACHE,
 ) -> pd.DataFrame:
+    """Batched version of fit_to_all_eos that returns only the parameters. The volumes and energies of all
+    configurations are packed with pack_ev_data and each EOS is fitted to all configs at once: the linear EOS
+    (mBM4, mBM5, BM4, BM5, LOG4, LOG5) by a stacked least squares solve, the nonlinear EOS (murnaghan, vinet,
+    morse) by a vectorized Levenberg-Marquardt (damped Gauss-Newton) iteration started from the mBM4 and BM4 fits
+    and a BP of 4, keeping the best start of each config.
+
+    Fits that are not possible (fewer volumes than EOS parameters) or that fail give NaN instead of raising.
+
+    Each fit also gets the RMS of the residuals, AIC and BIC (n ln(SSE/n) + 2k and n ln(SSE/n) + k ln(n) for n
+    volumes and k parameters) and the RMS of the leave-one-out residuals, residual / (1 - leverage) with the
+    leverages from the hat matrix of the fit. The leave-one-out residuals are exact for the linear EOS and a first
+    order approximation for the nonlinear EOS, so no refitting is needed. 'best_EOS' is the EOS with the lowest
+    LOO_RMS of each config. AIC, BIC and LOO_RMS are NaN if there are no more volumes than parameters.
+
+    Args:
+        df: Dataframe (or EVDataset) with headers ['config', 'volume', 'energy'] and optionally 'number_of_atoms'
+        and 'exclude'.
+        eos_names (list[str], optional): EOS to fit. Defaults to None, which fits all nine.
+        max_iterations (int, optional): iterations of the nonlinear fits. Defaults to 100.
+        tolerance (float, optional): relative change in the sum of squared residuals at which a nonlinear fit
+        is converged. Defaults to 1e-12.
+        cache (EOSFitCache, optional): cache for the result table, keyed by the packed data and the options.
+        Defaults to FIT_CACHE. None disables caching.
+
+    Raises:
+        ValueError: if an EOS name is not known
+
+    Returns:
+        pd.DataFrame: one row per (config, EOS) with the columns ['config', 'EOS', 'a', 'b', 'c', 'd', 'e', 'V0',
+        'E0', 'B', 'BP', 'B2P', 'RMS', 'AIC', 'BIC', 'LOO_RMS', 'best_EOS', 'volume_min', 'volume_max'], followed by
+        'number_of_atoms' if df has it. Curves are computed on demand with EOSModel.from_row(row).
     """
-    The input_files should be a list of strings containing the file names of the input files
 
-    the name of each input files should end in'_x' where x is the config_name ex:
-        str_0, str_1, str_2, ...
-        volume_energy_0, volume_energy_1, volume_energy_2, ...
+    if eos_names is None:
+        eos_names = LINEAR_EOS + NONLINEAR_EOS
+    unknown_names = [name for name in eos_names if name not in LINEAR_EOS + NONLINEAR_EOS]
+    if unknown_names:
+        raise ValueError(f"Unknown EOS {unknown_names}, must be in {LINEAR_EOS + NONLINEAR_EOS}")
+
+    configs, volumes, energies, mask = pack_ev_data(df)
+    df = _as_frame(df)
+    number_of_atoms = None
+    if "number_of_atoms" in df.columns:
+        number_of_atoms = df.groupby("config", sort=False)["number_of_atoms"].first()
+
+    if cache is not None:
+        # The labels are pickled so that e.g. the int config 1 and the str config "1" get different keys
+        key = fit_cache_key(
+            np.frombuffer(pickle.dumps(configs.tolist()), dtype=np.uint8),
+            volumes,
+            energies,
+            mask,
+            [] if number_of_atoms is None else number_of_atoms.reindex(configs).to_numpy(dtype=float),
+            function="fit_eos_batch",
+            config_dtype=configs.dtype,
+            eos_names=eos_names,
+            max_iterations=max_iterations,
+            tolerance=tolerance,
+        )
+        eos_parameters_df = cache.get(key)
+        if eos_parameters_df is not None:
+            return eos_parameters_df
+
+    volume_min = np.where(mask, volumes, np.inf).min(axis=1)
+    volume_max = np.where(mask, volumes, -np.inf).max(axis=1)
+
+    # The nonlinear fits start from the mBM4 and BM4 fits
+    fit_nonlinear = any(name in NONLINEAR_EOS for name in eos_names)
+    linear_names = [
+        name
+        for name in LINEAR_EOS
+        if name in eos_names or (fit_nonlinear and name in ["mBM4", "BM4"])
+    ]
+
+    results = {}
+    with np.errstate(all="ignore"):
+        for eos_name in linear_names:
+            basis = linear_eos_basis(eos_name, volumes)
+            coefficients, leverages = _batch_linear_least_squares(basis, energies, mask)
+            constants = np.zeros((len(configs), 5))
+            constants[:, : coefficients.shape[1]] = coefficients
+            constants[np.isnan(coefficients).any(axis=1)] = np.nan
+            parameters = _batch_linear_eos_parameters(
+                eos_name, coefficients, volume_min, volume_max
+            )
+            residuals = np.einsum("nmk,nk->nm", basis, coefficients) - energies
+            statistics = _batch_fit_statistics(
+                residuals, leverages, mask, coefficients.shape[1]
+            )
+            results[eos_name] = (constants, parameters, statistics)
+
+        for eos_name in NONLINEAR_EOS:
+            if eos_name not in eos_names:
+                continue
+            starts = []
+            for seed_name in ["mBM4", "BM4"]:
+                V0, E0, B, BP = results[seed_name][1][:, :4].T
+                starts.append(np.column_stack([V0, E0, B / EV_PER_CUBIC_ANGSTROM_TO_GPA, BP]))
+            starts.append(np.column_stack([starts[0][:, :3], np.full(len(configs), 4.0)]))
+            fitted = _batch_nonlinear_fit(
+                EOS_EQUATIONS[eos_name],
+                EOS_JACOBIANS[eos_name],
+                volumes,
+                energies,
+                mask,
+                starts,
+                max_iterations,
+                tolerance,
+            )
+            # Leave-one-out errors from the hat matrix of the Jacobian at the fitted parameters
+            residuals = _evaluate(EOS_EQUATIONS[eos_name], volumes, fitted) - energies
+            jacobian = _evaluate(EOS_JACOBIANS[eos_name], volumes, fitted)
+            statistics = _batch_fit_statistics(
+                residuals, _batch_leverages(jacobian, mask), mask, 4
+            )
+            results[eos_name] = (
+                *_nonlinear_eos_constants_and_parameters(eos_name, fitted),
+                statistics,
+            )
+
+    # One row per (config, EOS), ordered by config as in fit_to_all_eos
+    values = np.stack(
+        [np.column_stack(results[eos_name]) for eos_name in eos_names], axis=1
+    )
+    eos_parameters_df = pd.DataFrame(
+        values.reshape(-1, 14),
+        columns=["a", "b", "c", "d", "e", "V0", "E0", "B", "BP", "B2P"] + FIT_STATISTICS,
+    )
+    eos_parameters_df.insert(0, "config", np.repeat(configs.to_numpy(), len(eos_names)))
+    eos_parameters_df.insert(1, "EOS", np.tile(eos_names, len(configs)))
+
+    # The EOS with the lowest leave-one-out error of each config
+    loo_rms = values[:, :, -1]
+    has_loo_rms = ~np.isnan(loo_rms).all(axis=1)
+    best_eos = np.full(len(configs), None, dtype=object)
+    best_eos[has_loo_rms] = np.array(eos_names, dtype=object)[
+        np.nanargmin(loo_rms[has_loo_rms], axis=1)
+    ]
+    eos_parameters_df["best_EOS"] = np.repeat(best_eos, len(eos_names))
+
+    eos_parameters_df["volume_min"] = np.repeat(volume_min, len(eos_names))
+    eos_parameters_df["volume_max"] = np.repeat(volume_max, len(eos_names))
+
+    if number_of_atoms is not None:
+        eos_parameters_df["number_of_atoms"] = eos_parameters_df["config"].map(number_of_atoms)
+
+    if cache is not None:
+        cache.put(key, eos_parameters_df)
+    return eos_parameters_df
+
+
+def _batch_linear_least_squares(
+    basis: np.ndarray, energies: np.ndarray, mask: np.ndarray
+) -> np.ndarray:
+    # Stacked version of linear_least_squares, one system per config. Padding rows are zeroed out. Configs with
+    # fewer volumes than coefficients give NaN.
+    number_of_coefficients = basis.shape[-1]
+    basis = basis * mask[..., None]
+    scale = np.linalg.norm(basis, axis=1)
+    scale[scale == 0] = 1
+    u, singular_values, vt = np.linalg.svd(basis / scale[:, None, :], full_matrices=False)
+    cutoff = (
+        np.finfo(float).eps
+        * max(basis.shape[1], number_of_coefficients)
+        * singular_values[:, :1]
+    )
+    inverse_singular_values = np.where(
+        singular_values > cutoff, 1 / singular_values, 0
+    )
+    projected = np.einsum("nmk,nm->nk", u, energies * mask) * inverse_singular_values
+    coefficients = np.einsum("nkj,nk->nj", vt, projected) / scale
+    coefficients[mask.sum(axis=1) < number_of_coefficients] = np.nan
+    # Diagonal of the hat matrix
+    leverages = np.einsum("nmk,nk->nm", u**2, inverse_singular_values != 0)
+    return coefficients, leverages
+
+
+def _batch_leverages(design: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Diagonal of the hat matrix of each config, e.g. of the Jacobian of a nonlinear fit
+    design = np.where(mask[..., None] & np.isfinite(design), design, 0)
+    scale = np.linalg.norm(design, axis=1)
+    scale[scale == 0] = 1
+    u, singular_values, _ = np.linalg.svd(design / scale[:, None, :], full_matrices=False)
+    cutoff = np.finfo(float).eps * max(design.shape[1:]) * singular_values[:, :1]
+    return np.einsum("nmk,nk->nm", u**2, singular_values > cutoff)
+
+
+def _batch_fit_statistics(
+    residuals: np.ndarray, leverages: np.ndarray, mask: np.ndarray, number_of_parameters: int
+) -> np.ndarray:
+    # RMS, AIC, BIC and LOO_RMS of each config. The leave-one-out residuals are residual / (1 - leverage), which
+    # is exact for a linear fit. AIC, BIC and LOO_RMS need more volumes than parameters.
+    number_of_volumes = mask.sum(axis=1)
+    residuals = np.where(mask, residuals, 0)
+    sse = np.sum(residuals**2, axis=1)
+    rms = np.sqrt(sse / number_of_volumes)
+    log_likelihood_term = number_of_volumes * np.log(sse / number_of_volumes)
+    aic = log_likelihood_term + 2 * number_of_parameters
+    bic = log_likelihood_term + number_of_parameters * np.log(number_of_volumes)
+    loo_residuals = np.where(mask, residuals / (1 - leverages), 0)
+    loo_rms = np.sqrt(np.sum(loo_residuals**2, axis=1) / number_of_volumes)
+
+    statistics = np.column_stack([rms, aic, bic, loo_rms])
+    statistics[number_of_volumes < number_of_parameters] = np.nan
+    statistics[number_of_volumes == number_of_parameters, 1:] = np.nan
+    statistics[~np.isfinite(statistics)] = np.nan
+    return statistics
+
+
+def _batch_linear_eos_parameters(
+    eos_name: str, coefficients: np.ndarray, volume_min: np.ndarray, volume_max: np.ndarray
+) -> np.ndarray:
+    # V0, E0, B, BP, B2P of every config
+    if eos_name == "mBM4":
+        return np.column_stack(mBM4_eos_parameters(*coefficients.T))
+    if eos_name == "BM4":
+        return np.column_stack(BM4_eos_parameters(*coefficients.T))
+
+    eos_parameters_function = {
+        "mBM5": mBM5_eos_parameters,
+        "BM5": BM5_eos_parameters,
+        "LOG4": LOG4_eos_parameters,
+        "LOG5": LOG5_eos_parameters,
+    }[eos_name]
+    return np.column_stack(
+        eos_parameters_function(
+            np.column_stack([volume_min, volume_max]), *coefficients.T
+        )
+    )
+
+
+def _batch_nonlinear_fit(
+    equation,
+    jacobian_function,
+    volumes: np.ndarray,
+    energies: np.ndarray,
+    mask: np.ndarray,
+    starts: list[np.ndarray],
+    max_iterations: int,
+    tolerance: float,
+) -> np.ndarray:
+    # Levenberg-Marquardt for all (start, config) pairs at once, returns the best (V0, E0, B, BP) of each config
+    number_of_configs = len(volumes)
+    parameters = np.concatenate(starts)
+    volumes = np.tile(volumes, (len(starts), 1))
+    energies = np.tile(energies, (len(starts), 1))
+    mask = np.tile(mask, (len(starts), 1))
+
+    def sum_of_squares(volumes, energies, mask, parameters):
+        residuals = (_evaluate(equation, volumes, parameters) - energies) * mask
+        sse = np.sum(residuals**2, axis=1)
+        return np.where(np.isfinite(sse), sse, np.inf), residuals
+
+    sse, residuals = sum_of_squares(volumes, energies, mask, parameters)
+    damping = np.full(len(parameters), 1e-3)
+    converged = ~np.isfinite(sse) | (mask.sum(axis=1) < 4)
+    for _ in range(max_iterations):
+        active = np.flatnonzero(~converged)
+        if not len(active):
+            break
+        active_volumes, active_mask = volumes[active], mask[active]
+        jacobian = (
+            _evaluate(jacobian_function, active_volumes, parameters[active])
+            * active_mask[..., None]
+        )
+        jtj = np.einsum("nmi,nmj->nij", jacobian, jacobian)
+        gradient = np.einsum("nmi,nm->ni", jacobian, residuals[active])
+        damped = jtj + damping[active, None, None] * (
+            np.eye(4) * np.diagonal(jtj, axis1=1, axis2=2)[:, None, :]
+        )
+        try:
+            step = -np.linalg.solve(damped, gradient[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = -np.einsum("nij,nj->ni", np.linalg.pinv(damped), gradient)
+
+        trial_parameters = parameters[active] + step
+        trial_sse, trial_residuals = sum_of_squares(
+            active_volumes, energies[active], active_mask, trial_parameters
+        )
+        improved = trial_sse < sse[active]
+        converged[active] = (
+            improved & (sse[active] - trial_sse <= tolerance * sse[active])
+        ) | (damping[active] > 1e12)
+
+        updated = active[improved]
+        parameters[updated] = trial_parameters[improved]
+        residuals[updated] = trial_residuals[improved]
+        sse[updated] = trial_sse[improved]
+        damping[active] = np.where(improved, damping[active] / 3, damping[active] * 3)
+
+    sse = sse.reshape(len(starts), number_of_configs)
+    parameters = parameters.reshape(len(starts), number_of_configs, 4)
+    best = np.argmin(sse, axis=0)
+    fitted = parameters[best, np.arange(number_of_configs)]
+    fitted[~np.isfinite(sse.min(axis=0)) | (mask[:number_of_configs].sum(axis=1) < 4)] = np.nan
+    return fitted
+
+
+def _evaluate(equation, volumes: np.ndarray, parameters: np.ndarray) -> np.ndarray:
+    return equation(volumes, *(parameters[:, i, None] for i in range(parameters.shape[1])))
+
+
+def _nonlinear_eos_constants_and_parameters(
+    eos_name: str, fitted: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # Constants and (V0, E0, B, BP, B2P) as returned by murnaghan, vinet and morse
+    V0, E0, B, BP = fitted.T
+    constants = np.zeros((len(fitted), 5))
+    if eos_name == "murnaghan":
+        B2P = np.where(np.isnan(V0), np.nan, 0.0)
+    elif eos_name == "vinet":
+        B2P = (19 - 18 * BP - 9 * BP**2) / (36 * B) / EV_PER_CUBIC_ANGSTROM_TO_GPA
+    else:
+        constants[:, 0] = E0 + (9 * B * V0) / (2 * (BP - 1) ** 2)
+        constants[:, 1] = (-9 * B * V0 * np.exp(BP - 1)) / (BP - 1) ** 2
+        constants[:, 2] = (9 * B * V0 * np.exp(2 * BP - 2)) / (2 * (BP - 1) ** 2)
+        constants[:, 3] = (1 - BP) / V0 ** (1 / 3)
+        B2P = (5 - 5 * BP - 2 * BP**2) / (9 * B) / EV_PER_CUBIC_ANGSTROM_TO_GPA
+    constants[np.isnan(V0)] = np.nan
+    parameters = np.column_stack([V0, E0, B * EV_PER_CUBIC_ANGSTROM_TO_GPA, BP, B2P])
+    return constants, parameters
+
+
+EOS_EQUATIONS = {
+    "mBM4": mBM4_equation,
+    "mBM5": mBM5_equation,
+    "BM4": BM4_equation,
+    "BM5": BM5_equation,
+    "LOG4": LOG4_equation,
+    "LOG5": LOG5_equation,
+    "murnaghan": murnaghan_equation,
+    "vinet": vinet_equation,
+    "morse": morse_equation,
+}
+EOS_JACOBIANS = {
+    "murnaghan": murnaghan_jacobian,
+    "vinet": vinet_jacobian,
+    "morse": morse_jacobian,
+}
+EOS_DERIVATIVES = {
+    "mBM4": mBM4_derivative,
+    "mBM5": mBM5_derivative,
+    "BM4": BM4_derivative,
+    "BM5": BM5_derivative,
+    "LOG4": LOG4_derivative,
+    "LOG5": LOG5_derivative,
+    "murnaghan": murnaghan_derivative,
+    "vinet": vinet_derivative,
+    "morse": morse_derivative,
+}
+
+
+class EOSModel:
+    """A fitted EOS of one configuration. Only the constants and parameters are stored; energies and pressures are
+    computed on demand, e.g. for the configs that are plotted.
+
+    Example:
+        eos_parameters_df = fit_eos_batch(df)
+        model = EOSModel.from_row(eos_parameters_df.iloc[0])
+        volumes = model.volume_range()
+        energies, pressures = model.evaluate(volumes), model.pressure(volumes)
+    """
+
+    def __init__(
+        self,
+        eos_name: str,
+        constants: np.ndarray,
+        parameters: np.ndarray,
+        volume_min: float = None,
+        volume_max: float = None,
+    ) -> None:
+        """
+        Args:
+            eos_name (str): one of LINEAR_EOS or NONLINEAR_EOS
+            constants (np.ndarray): a, b, c, d, e as returned by the EOS fitting functions
+            parameters (np.ndarray): V0, E0, B (GPa), BP, B2P as returned by the EOS fitting functions
+            volume_min (float, optional): smallest fitted volume. Defaults to None.
+            volume_max (float, optional): largest fitted volume. Defaults to None.
+
+        Raises:
+            ValueError: if eos_name is not known
+        """
+
+        if eos_name not in LINEAR_EOS + NONLINEAR_EOS:
+            raise ValueError(f"eos_name must be one of {LINEAR_EOS + NONLINEAR_EOS}")
+        self.eos_name = eos_name
+        self.constants = np.asarray(constants, dtype=float)
+        self.parameters = np.asarray(parameters, dtype=float)
+        self.volume_min = volume_min
+        self.volume_max = volume_max
+
+    @classmethod
+    def from_row(cls, row) -> "EOSModel":
+        """Creates the model of one row of the parameter table of fit_eos_batch or fit_to_all_eos.
+
+        Args:
+            row (pd.Series or dict): row with the columns 'EOS', 'a'-'e' and 'V0', 'E0', 'B', 'BP', 'B2P', and
+            optionally 'volume_min' and 'volume_max'
+
+        Returns:
+            EOSModel: the fitted EOS
+        """
+
+        return cls(
+            row["EOS"],
+            [row[name] for name in ["a", "b", "c", "d", "e"]],
+            [row[name] for name in ["V0", "E0", "B", "BP", "B2P"]],
+            row.get("volume_min"),
+            row.get("volume_max"),
+        )
+
+    def volume_range(self, number_of_points: int = 1000) -> np.ndarray:
+        """Evenly spaced volumes between the smallest and largest fitted volume, as used for the curves of the EOS
+        fitting functions.
+
+        Args:
+            number_of_points (int, optional): Defaults to 1000.
+
+        Raises:
+            ValueError: if the model has no volume range
+
+        Returns:
+            np.ndarray: volumes
+        """
+
+        if self.volume_min is None or self.volume_max is None:
+            raise ValueError("The model has no volume_min and volume_max")
+        return np.linspace(self.volume_min, self.volume_max, number_of_points)
+
+    def evaluate(self, volumes: float | np.ndarray) -> float | np.ndarray:
+        """Energy of the EOS.
+
+        Args:
+            volumes (float | np.ndarray): volumes
+
+        Returns:
+            float | np.ndarray: energies
+        """
 
-    The contents of the input files should be organized as two columns separated by a space
-    and not contain any headers ex:
+        equation = EOS_EQUATIONS[self.eos_name]
+        if self.eos_name in LINEAR_EOS:
+            return equation(volumes, *self.constants[: _number_of_constants(self.eos_name)])
+
+        V0, E0, B, BP, _ = self.parameters
+        return equation(volumes, V0, E0, B / EV_PER_CUBIC_ANGSTROM_TO_GPA, BP)
+
+    def pressure(self, volumes: float | np.ndarray) -> float | np.ndarray:
+        """Pressure of the EOS in GPa.
+
+        Args:
+            volumes (float | np.ndarray): volumes
+
+        Returns:
+            float | np.ndarray: pressures
+        """
+
+        derivative = EOS_DERIVATIVES[self.eos_name]
+        if self.eos_name in LINEAR_EOS:
+            energy_derivative = derivative(
+                volumes, *self.constants[1 : _number_of_constants(self.eos_name)]
+            )
+        elif self.eos_name == "morse":
+            energy_derivative = derivative(volumes, *self.constants[1:4])
+        else:
+            V0, _, B, BP, _ = self.parameters
+            energy_derivative = derivative(
+                volumes, V0, B / EV_PER_CUBIC_ANGSTROM_TO_GPA, BP
+            )
+        return -1 * EV_PER_CUBIC_ANGSTROM_TO_GPA * energy_derivative
+
+
+def _number_of_constants(eos_name: str) -> int:
+    return 5 if eos_name.endswith("5") else 4
+
+
+def convert_input_files_to_df(
+    input_files: list[str],
+    left_col: str,
+    right_col: str,
+    n_processes: int = 1,
+    cache_path: str = None,
+) -> pd.DataFrame:
+    """Reads two-column input files, one per configuration, into a single DataFrame.
+
+    The name of each input file should end in '_x' where x is the config name, e.g. str_0, str_1, ... or
+    volume_energy_0, volume_energy_1, ... The files contain two columns separated by whitespace and no header,
+    e.g.
         1.0 2.0
         2.0 3.0
-        3.0 4.0
         ...
-    the data reader is np.loadtxt()
 
-    left_col is the type of data in the left column ex: 'volume'
-    right_col is the type of data in the right column ex: 'energy'
+    All files are read into NumPy arrays and concatenated once. With a cache_path, the data is also stored in a
+    binary .npz file together with the size and modification time of each input file, and on the next call only
+    new or changed files are read again.
+
+    Args:
+        input_files (list[str]): paths of the input files
+        left_col (str): type of data in the left column, e.g. 'volume'
+        right_col (str): type of data in the right column, e.g. 'energy'
+        n_processes (int, optional): number of worker processes for reading. None uses all cores. Defaults to 1.
+        cache_path (str, optional): path of the .npz cache file. Defaults to None, which does not cache.
+
+    Returns:
+        pd.DataFrame: DataFrame with the columns ['config', left_col, right_col]
     """
-    df = pd.DataFrame(columns=["config", left_col, right_col])
+
+    if n_processes is None:
+        n_processes = os.cpu_count()
+
+    paths = [os.path.abspath(input_file) for input_file in input_files]
+    fingerprints = [_input_file_fingerprint(path) for path in paths]
+    cached = {}
+    if cache_path is not None and os.path.isfile(cache_path):
+        cached = _load_input_files_cache(cache_path)
+
+    data = [None] * len(paths)
+    to_read = []
+    for i, (path, fingerprint) in enumerate(zip(paths, fingerprints)):
+        if path in cached and cached[path][0] == fingerprint:
+            data[i] = cached[path][1]
+        else:
+            to_read.append(i)
+
+    read_paths = [paths[i] for i in to_read]
+    if n_processes == 1 or len(read_paths) <= 1:
+        read_data = list(map(_read_input_file, read_paths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_processes) as executor:
+            read_data = list(
+                executor.map(
+                    _read_input_file,
+                    read_paths,
+                    chunksize=max(1, len(read_paths) // (4 * n_processes)),
+                )
+            )
+    for i, file_data in zip(to_read, read_data):
+        data[i] = file_data
+
+    counts = np.array([len(file_data) for file_data in data], dtype=np.int64)
+    values = np.concatenate(data) if data else np.empty((0, 2))
+    configs = []
     for input_file in input_files:
         config = os.path.splitext(os.path.basename(input_file))[0]
         if "_" in config:
             config = config.split("_")[-1]
-        data = np.loadtxt(input_file)
-        left_data = data[:, 0]
-        right_data = data[:, 1]
-        for i in range(len(left_data)):
-            df.loc[len(df)] = {
-                "config": config,
-                left_col: left_data[i],
-                right_col: right_data[i],
-            }
-    return df
+        configs.append(config)
+
+    if cache_path is not None and to_read:
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(
+                file,
+                paths=np.array(paths, dtype=str),
+                fingerprints=np.array(fingerprints, dtype=np.int64).reshape(-1, 2),
+                counts=counts,
+                values=values,
+            )
+        os.replace(temporary_path, cache_path)
+
+    return pd.DataFrame(
+        {
+            "config": np.repeat(np.array(configs, dtype=object), counts),
+            left_col: values[:, 0],
+            right_col: values[:, 1],
+        }
+    )
 
 
-# TODO: review
-def select_data(df: pd.DataFrame, selection_dict: dict) -> pd.DataFrame:
-    """
-    Used to cherry pick data from a dataframe based on the config name and the volume rank
-    the selection_dict should be a dictionary with the following format:
-    selection_dict = {10: [0,1,2,3],
-                        11: [0,1,2,3],
-                        12: [0,1,2,3],
-                        ...}
-    where the keys are the config names and the values are the volumes 0=lowest
-    volume, 1=second lowest volume, etc.
+def _read_input_file(path: str) -> np.ndarray:
+    return np.loadtxt(path, ndmin=2, usecols=(0, 1))
+
 
+def _input_file_fingerprint(path: str) -> tuple[int, int]:
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _load_input_files_cache(cache_path: str) -> dict:
+    # {path: ((size, mtime_ns), data)} of the cached input files
+    with np.load(cache_path) as cache:
+        offsets = np.concatenate([[0], np.cumsum(cache["counts"])])
+        values = cache["values"]
+        return {
+            str(path): (tuple(int(value) for value in fingerprint), values[start:end])
+            for path, fingerprint, start, end in zip(
+                cache["paths"], cache["fingerprints"], offsets[:-1], offsets[1:]
+            )
+        }
 
+
+class EVDataset:
+    """Volume-energy data of many configurations, sorted by config and volume and indexed by (config, volume_rank),
+    where volume_rank is the dense rank of the volume within its config (1 = lowest volume), as in select_data. An
+    existing 'volume_rank' column is kept, so a selection keeps the ranks of the full dataset.
+
+    The rows of each config are stored contiguously and the start and end row of every config is stored, so the
+    data of one config is a slice instead of a boolean filter. If the data has a 'number_of_atoms' column,
+    'volume_per_atom' and 'energy_per_atom' columns are added.
+
+    fit_to_all_eos, fit_eos_batch, pack_ev_data, select_data, plot_ev and plot_energy_difference accept an
+    EVDataset in place of a DataFrame.
     """
-    # first rank the volumes from lowest to highest
-    df["volume_rank"] = df.groupby("config")["volume"].rank(method="dense").astype(int)
-    print(df)
-    selected_data = pd.DataFrame()  # Initialize selected_data variable
-    for config in selection_dict.keys():
-        for volume_rank in selection_dict[config]:
-            selected_data = pd.concat(
-                [
-                    selected_data,
-                    df[(df["config"] == config) & (df["volume_rank"] == volume_rank)],
-                ],
-                ignore_index=True,
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        """
+        Args:
+            df (pd.DataFrame): DataFrame with at least the columns 'config', 'volume' and 'energy', e.g. from
+            extract_configuration_data or convert_input_files_to_df
+
+        Raises:
+            ValueError: if a column is missing
+        """
+
+        missing_columns = [
+            column for column in ["config", "volume", "energy"] if column not in df.columns
+        ]
+        if missing_columns:
+            raise ValueError(f"df is missing the columns {missing_columns}")
+
+        codes, configs = pd.factorize(df["config"])
+        order = np.lexsort((df["volume"].to_numpy(), codes))
+        data = df.iloc[order].reset_index(drop=True)
+        if "number_of_atoms" in data.columns:
+            if "volume_per_atom" not in data.columns:
+                data["volume_per_atom"] = data["volume"] / data["number_of_atoms"]
+            if "energy_per_atom" not in data.columns:
+                data["energy_per_atom"] = data["energy"] / data["number_of_atoms"]
+
+        sorted_codes = codes[order]
+        counts = np.bincount(sorted_codes, minlength=len(configs))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        if "volume_rank" in data.columns:
+            volume_rank = data.pop("volume_rank").to_numpy()
+        else:
+            volumes = data["volume"].to_numpy()
+            new_volume = np.ones(len(data), dtype=bool)
+            new_volume[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (
+                volumes[1:] != volumes[:-1]
+            )
+            cumulative_new_volumes = np.cumsum(new_volume)
+            volume_rank = (
+                cumulative_new_volumes
+                - np.repeat(cumulative_new_volumes[starts], counts)
+                + 1
             )
-    return selected_data
 
+        data.index = pd.MultiIndex.from_arrays(
+            [data["config"].to_numpy(), volume_rank], names=["config", "volume_rank"]
+        )
+        self.data = data.drop(columns=["config"])
+        self.configs = configs
+        self._offsets = {
+            config: (int(start), int(end)) for config, start, end in zip(configs, starts, ends)
+        }
+
+    @classmethod
+    def from_files(
+        cls, input_files: list[str], n_processes: int = 1, cache_path: str = None
+    ) -> "EVDataset":
+        """Reads volume_energy_* input files with convert_input_files_to_df.
+
+        Args:
+            input_files (list[str]): paths of the input files
+            n_processes (int, optional): see convert_input_files_to_df. Defaults to 1.
+            cache_path (str, optional): see convert_input_files_to_df. Defaults to None.
+
+        Returns:
+            EVDataset: the data of all files
+        """
+
+        return cls(
+            convert_input_files_to_df(
+                input_files, "volume", "energy", n_processes=n_processes, cache_path=cache_path
+            )
+        )
 
-# TODO: review
-def plot_mv(df: pd.DataFrame, show_fig: bool = True) -> go.Figure:
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, config) -> bool:
+        return config in self._offsets
+
+    def group(self, config) -> pd.DataFrame:
+        """Returns the rows of one configuration.
+
+        Args:
+            config: name of the configuration
+
+        Returns:
+            pd.DataFrame: rows of the config, sorted by volume
+        """
+
+        start, end = self._offsets[config]
+        return self.data.iloc[start:end]
+
+    def per_config(self):
+        """Iterates over the configurations in order of first appearance.
+
+        Yields:
+            tuple(config, pd.DataFrame): name and rows of each config
+        """
+
+        for config, (start, end) in self._offsets.items():
+            yield config, self.data.iloc[start:end]
+
+    def select(self, selection_dict: dict) -> "EVDataset":
+        """Selects volumes by config and volume rank.
+
+        Args:
+            selection_dict (dict): {config: [volume_rank, ...]}, e.g. {10: [1, 2, 3, 4], 11: [1, 2, 3]}. Configs and
+            ranks that are not in the dataset are ignored.
+
+        Returns:
+            EVDataset: the selected rows
+        """
+
+        keys = pd.MultiIndex.from_tuples(
+            [
+                (config, volume_rank)
+                for config, volume_ranks in selection_dict.items()
+                for volume_rank in volume_ranks
+            ],
+            names=["config", "volume_rank"],
+        )
+        positions = self.data.index.get_indexer_for(keys)
+        positions = np.unique(positions[positions >= 0])
+        return EVDataset(self.to_frame().iloc[positions])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the data as a flat DataFrame with 'config' and 'volume_rank' columns.
+
+        Returns:
+            pd.DataFrame: the data, sorted by config and volume
+        """
+
+        return self.data.reset_index()
+
+    def to_arrays(self) -> tuple[pd.Index, np.ndarray, np.ndarray, np.ndarray]:
+        """Packs the volumes and energies into padded 2D arrays, see pack_ev_data.
+
+        Returns:
+            tuple(configs, volumes, energies, mask): configs in order of first appearance and arrays of shape
+            (number_of_configs, largest number of volumes)
+        """
+
+        if "exclude" in self.data.columns and self.data["exclude"].fillna(False).astype(bool).any():
+            return pack_ev_data(self.to_frame())
+
+        counts = np.array([end - start for start, end in self._offsets.values()], dtype=np.int64)
+        codes = np.repeat(np.arange(len(counts)), counts)
+        position = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        shape = (len(counts), counts.max() if len(counts) else 0)
+        volumes = np.ones(shape)
+        energies = np.zeros(shape)
+        mask = np.zeros(shape, dtype=bool)
+        volumes[codes, position] = self.data["volume"].to_numpy(dtype=float)
+        energies[codes, position] = self.data["energy"].to_numpy(dtype=float)
+        mask[codes, position] = True
+        return self.configs, volumes, energies, mask
+
+
+def _as_frame(data) -> pd.DataFrame:
+    # Lets the fitting and plotting functions accept an EVDataset
+    if isinstance(data, EVDataset):
+        return data.to_frame()
+    return data
+
+
+def select_data(df: pd.DataFrame | EVDataset, selection_dict: dict) -> pd.DataFrame:
+    """Used to cherry pick data from a dataframe based on the config name and the volume rank.
+
+    Args:
+        df (pd.DataFrame | EVDataset): data with the columns 'config', 'volume' and 'energy'
+        selection_dict (dict): {config: [volume_rank, ...]} where the volume ranks are 1 = lowest volume,
+        2 = second lowest volume, etc., e.g. {10: [1, 2, 3, 4], 11: [1, 2, 3, 4]}
+
+    Returns:
+        pd.DataFrame: the selected rows with a 'volume_rank' column
     """
-    data may be a single pandas data frame or a list of pandas data frames
-    data may also be a list of input_file names as strings ex:
-        ['str_0', 'str_1', 'str_2', ...]
 
-    Not sure if a list of dataframe will actually work. the function simply
-    concats them all together # TODO: test this
+    if not isinstance(df, EVDataset):
+        df = EVDataset(df)
+    return df.select(selection_dict).to_frame()
+
 
-    df is a data frame with columns ['config', '# of ion', 'volume', 'tot']
-    breaks if missing these columns
+def plot_mv(df: pd.DataFrame, show_fig: bool = True) -> go.Figure:
+    """Plots the magnetic moment of each ion as a function of volume.
+
+    Args:
+        df (pd.DataFrame): long magnetization table with columns ['config', 'volume', 'ion', 'tot'] (from
+        extract_configuration_data(return_mag_table=True)), or a DataFrame with a nested 'mag_data' column
+        (from extract_configuration_data(collect_mag_data=True)), which is converted to the long table.
+        show_fig (bool, optional): Defaults to True.
+
+    Returns:
+        fig (plotly.graph_objs._figure.Figure): A Plotly figure.
     """
-    # Create a new dataframe where each 'mag_data' dataframe is associated with its corresponding 'volume' and 'config' values
-    df_new = pd.concat(
-        [
-            df_mag.assign(volume=v, config=c)
-            for v, c, df_mag in zip(df["volume"], df["config"], df["mag_data"])
-        ]
-    )
+
+    if "mag_data" in df.columns:
+        mag_table = mag_data_to_mag_table(df)
+    else:
+        mag_table = df
+
     fig = px.line(
-        df_new.sort_values(
-            [
-                "# of ion",
-                "volume",
-            ]
-        ),
+        mag_table.sort_values(["ion", "config", "volume"]),
         x="volume",
         y="tot",
-        color="# of ion",
-        symbol="# of ion",
-        hover_data=["config", "# of ion", "volume", "tot"],
+        color="ion",
+        symbol="ion",
+        line_group="config",
+        hover_data=["config", "ion", "volume", "tot"],
         template="plotly_white",
     )
     fig.update_layout(xaxis_title="Volume [A^3]", yaxis_title="Magnetic Moment [mu_B]")
@@ -1475,6 +2651,10 @@ def assign_marker_symbols_to_configs(df: pd.DataFrame) -> dict:
     return config_symbols
 
 
+# Number of configs above which plot_ev(render_mode="auto") switches to the batched WebGL traces
+WEBGL_CONFIG_THRESHOLD = 200
+
+
 # TODO: highlight exact fitted function minimum using V0 and E0.
 def plot_ev(
     data,
@@ -1488,11 +2668,13 @@ def plot_ev(
     cmap="plotly",
     marker_alpha=1,
     marker_size=10,
+    render_mode="auto",
+    max_curve_points=100,
 ):
     """Plot the energy vs volume curves for each configuration.
 
     Args:
-        data (pandas.DataFrame, list of pandas.DataFrame, or list of str): Data must be a pandas
+        data (EVDataset, pandas.DataFrame, list of pandas.DataFrame, or list of str): Data must be an EVDataset, a pandas
         DataFrame, list of pandas DataFrames, or a list of input_file names as strings containing the
         volumes, energies, and number of atoms of each configuration.
         eos_fitting (str, optional): EOS name. Defaults to "BM4".
@@ -1505,13 +2687,27 @@ def plot_ev(
         cmap (str, optional): Defaults to 'plotly'.
         marker_alpha (int, optional): Defaults to 1.
         marker_size (int, optional): Defaults to 10.
+        render_mode (str, optional): "svg" adds a Scatter trace for the data and the fit of every config. "webgl"
+        is for thousands of configs: the data points are merged into one Scattergl trace per marker symbol, the fits
+        into one NaN-separated Scattergl trace per color (or per EOS if eos_fitting is "all") and the minima into
+        one trace, with the config in the hover text instead of the legend. "auto" uses "webgl" for more than
+        WEBGL_CONFIG_THRESHOLD configs. Defaults to "auto".
+        max_curve_points (int, optional): number of points of a fit that spans the whole volume axis in "webgl"
+        mode, i.e. one point every ~8 pixels of the 840 pixel wide figure. Shorter fits get proportionally fewer
+        points, but at least 10. Defaults to 100.
+
+    Raises:
+        ValueError: if eos_fitting is not None, "all" or a known EOS, or render_mode is not "auto", "svg" or
+        "webgl"
 
     Returns:
         fig (plotly.graph_objs._figure.Figure): A Plotly figure.
     """
 
-    # Check if data is a pandas DataFrame or a list of pandas DataFrames
-    if isinstance(data, pd.DataFrame):
+    # Check if data is an EVDataset, a pandas DataFrame or a list of pandas DataFrames
+    if isinstance(data, EVDataset):
+        df = data.to_frame()
+    elif isinstance(data, pd.DataFrame):
         df = data
 
     # Check if each element of the list is the same type as the zeroth element
@@ -1525,12 +2721,37 @@ def plot_ev(
 
     else:
         raise ValueError(
-            "data must be a pandas DataFrame, list of pandas DataFrames, or a list of input_file names as strings"
+            "data must be an EVDataset, a pandas DataFrame, list of pandas DataFrames, or a list of input_file names as strings"
         )
+    dataset = data if isinstance(data, EVDataset) else EVDataset(df)
 
-    # Create a data frame with the eos fits for each config
+    if render_mode == "auto":
+        render_mode = "webgl" if len(dataset.configs) > WEBGL_CONFIG_THRESHOLD else "svg"
+    elif render_mode not in ["svg", "webgl"]:
+        raise ValueError('render_mode must be "auto", "svg" or "webgl"')
+    if not isinstance(per_atom, bool):
+        raise ValueError("per_atom must be True or False")
+
+    # Create a data frame with the eos fits for each config. Only the curves of the plotted EOS are computed.
     if eos_fitting != None:
-        eos_df, _ = fit_to_all_eos(df)
+        if eos_fitting == "all":
+            eos_names = LINEAR_EOS + NONLINEAR_EOS
+        elif eos_fitting in LINEAR_EOS + NONLINEAR_EOS:
+            eos_names = [eos_fitting]
+        else:
+            raise ValueError(
+                f"eos_fitting must be None, 'all' or one of {LINEAR_EOS + NONLINEAR_EOS}"
+            )
+        fit_df = df
+        if "exclude" in fit_df.columns:
+            fit_df = fit_df[~fit_df["exclude"].fillna(False).astype(bool)]
+        fits = fit_eos_batch(fit_df, eos_names=eos_names)
+        if render_mode == "svg":
+            eos_df = _add_eos_curves(fits, fit_df)
+            # Fits that are not possible (too few volumes) or that failed are NaN and are not plotted
+            eos_df = eos_df[
+                [np.isfinite(energies).any() for energies in eos_df["energies"]]
+            ]
 
     # Assign colors and symbols
     config_colors = assign_colors_to_configs(df, alpha=marker_alpha, cmap=cmap)
@@ -1544,33 +2765,42 @@ def plot_ev(
         )
     )
 
-    for config in df["config"].unique():
-        config_df = df[df["config"] == config]
+    if render_mode == "webgl":
+        _add_batched_ev_traces(
+            fig,
+            dataset,
+            fits if eos_fitting != None else None,
+            highlight_minimum,
+            per_atom,
+            config_colors,
+            config_symbols,
+            marker_size,
+            max_curve_points,
+        )
 
-        if isinstance(per_atom, bool):
+    else:
+        for config, config_df in dataset.per_config():
             x = config_df["volume"]
             y = config_df["energy"]
 
             if per_atom:
                 x = x / config_df["number_of_atoms"]
                 y = y / config_df["number_of_atoms"]
-        else:
-            raise ValueError("per_atom must be True or False")
 
-        fig.add_trace(
-            go.Scatter(
-                x=x,
-                y=y,
-                mode="markers",
-                marker=dict(
-                    size=marker_size,
-                    color=config_colors[config],
-                    symbol=config_symbols[config],
-                ),
-                legendgroup="EOS",
-                name=f"{config}",
+            fig.add_trace(
+                go.Scatter(
+                    x=x,
+                    y=y,
+                    mode="markers",
+                    marker=dict(
+                        size=marker_size,
+                        color=config_colors[config],
+                        symbol=config_symbols[config],
+                    ),
+                    legendgroup="EOS",
+                    name=f"{config}",
+                )
             )
-        )
 
     if isinstance(per_atom, bool):
         atom_suffix = "/atom" if per_atom else ""
@@ -1587,9 +2817,8 @@ def plot_ev(
         )
 
     # Loop over configs in the eos data frame and plot the eos fits
-    if eos_fitting != None:
-        for config in eos_df["config"].unique():
-            eos_config_df = eos_df[eos_df["config"] == config]
+    if eos_fitting != None and render_mode == "svg":
+        for config, eos_config_df in eos_df.groupby("config", sort=False):
             if eos_fitting in eos_config_df["EOS"].unique():
                 eos_name_df = eos_config_df[eos_config_df["EOS"] == eos_fitting]
 
@@ -1615,10 +2844,9 @@ def plot_ev(
 
                 # Plot the equilibrium energy and volume for each config
                 if highlight_minimum == True:
-                    min_energy = min(eos_name_df["energies"].values[0])
-                    volume_at_min_energy = eos_name_df["volumes"].values[0][
-                        np.where(eos_name_df["energies"].values[0] == min_energy)[0][0]
-                    ]
+                    minimum = np.nanargmin(eos_name_df["energies"].values[0])
+                    min_energy = eos_name_df["energies"].values[0][minimum]
+                    volume_at_min_energy = eos_name_df["volumes"].values[0][minimum]
 
                     x = volume_at_min_energy
                     y = min_energy
@@ -1683,12 +2911,9 @@ def plot_ev(
 
                     # Plot the minimum energy data point for each config from the fitting equation
                     if highlight_minimum == True:
-                        min_energy = min(eos_name_df["energies"].values[0])
-                        volume_at_min_energy = eos_name_df["volumes"].values[0][
-                            np.where(eos_name_df["energies"].values[0] == min_energy)[
-                                0
-                            ][0]
-                        ]
+                        minimum = np.nanargmin(eos_name_df["energies"].values[0])
+                        min_energy = eos_name_df["energies"].values[0][minimum]
+                        volume_at_min_energy = eos_name_df["volumes"].values[0][minimum]
                         if per_atom == False:
                             fig.add_trace(
                                 go.Scatter(
@@ -1728,10 +2953,9 @@ def plot_ev(
                 pass
 
             else:
-                print(
-                    f"Warning: eos_fitting '{eos_fitting}' not found in eos_df. Skipping."
+                raise ValueError(
+                    f"eos_fitting must be None, 'all' or one of {LINEAR_EOS + NONLINEAR_EOS}"
                 )
-                sys.exit(1)
 
     axis_params = dict(
         showline=True,
@@ -1765,6 +2989,137 @@ def plot_ev(
     return fig
 
 
+def _add_batched_ev_traces(
+    fig: go.Figure,
+    dataset: EVDataset,
+    fits: pd.DataFrame,
+    highlight_minimum: bool,
+    per_atom: bool,
+    config_colors: dict,
+    config_symbols: dict,
+    marker_size: int,
+    max_curve_points: int,
+) -> None:
+    # The render_mode="webgl" traces of plot_ev: one trace per marker symbol for the data, one NaN-separated trace per color (or per
+    # EOS when all EOS are plotted) for the fits and one trace for the minima. The config of each point is kept in
+    # customdata for the hover text.
+    if highlight_minimum not in [True, False]:
+        raise ValueError("highlight_minimum must be True or False")
+
+    data = dataset.to_frame()
+    configs = data["config"].to_numpy()
+    x = data["volume"].to_numpy(dtype=float)
+    y = data["energy"].to_numpy(dtype=float)
+    if per_atom:
+        x = x / data["number_of_atoms"].to_numpy(dtype=float)
+        y = y / data["number_of_atoms"].to_numpy(dtype=float)
+
+    # Plotly validates per-point color and symbol strings one by one, so the data is split by symbol and the
+    # colors are given as indices into a discrete colorscale
+    colors = {color: i for i, color in enumerate(dict.fromkeys(config_colors.values()))}
+    color_index = data["config"].map(
+        {config: colors[color] for config, color in config_colors.items()}
+    ).to_numpy(dtype=float)
+    colorscale = [
+        [i / max(len(colors) - 1, 1), color] for i, color in enumerate(colors)
+    ]
+    symbols = data["config"].map(config_symbols).to_numpy()
+    customdata = np.column_stack([configs, data["volume_rank"].to_numpy()])
+    for symbol in dict.fromkeys(symbols):
+        rows = symbols == symbol
+        fig.add_trace(
+            go.Scattergl(
+                x=x[rows],
+                y=y[rows],
+                mode="markers",
+                marker=dict(
+                    size=marker_size,
+                    color=color_index[rows],
+                    colorscale=colorscale,
+                    cmin=0,
+                    cmax=max(len(colors) - 1, 1),
+                    symbol=symbol,
+                ),
+                customdata=customdata[rows],
+                hovertemplate="config %{customdata[0]}, volume rank %{customdata[1]}"
+                "<br>(%{x}, %{y})<extra></extra>",
+                name=f"data ({symbol})",
+                legendgroup="EOS",
+                showlegend=False,
+            )
+        )
+
+    if fits is None:
+        return
+
+    all_eos = fits["EOS"].nunique() > 1
+    x_span = np.ptp(x) if len(x) else 0
+    curves = collections.defaultdict(lambda: ([], [], []))
+    minima = ([], [], [])
+    for row in fits.to_dict("records"):
+        model = EOSModel.from_row(row)
+        if not np.isfinite(model.volume_min) or not np.all(
+            np.isfinite(model.constants[: _number_of_constants(model.eos_name)])
+        ):
+            continue
+        number_of_atoms = row["number_of_atoms"] if per_atom else 1
+
+        # Points in proportion to the width of the curve on the volume axis
+        curve_span = (model.volume_max - model.volume_min) / number_of_atoms
+        number_of_points = int(
+            np.clip(
+                np.ceil(max_curve_points * curve_span / x_span) if x_span > 0 else 10,
+                min(10, max_curve_points),
+                max_curve_points,
+            )
+        )
+        volumes = model.volume_range(number_of_points)
+        group = row["EOS"] if all_eos else config_colors[row["config"]]
+        curve_x, curve_y, curve_labels = curves[group]
+        curve_x.extend([volumes / number_of_atoms, [np.nan]])
+        curve_y.extend([model.evaluate(volumes) / number_of_atoms, [np.nan]])
+        curve_labels.extend([[f"{row['config']} {row['EOS']}"] * number_of_points, [None]])
+
+        # Minimum of the 1000-point curve, as in render_mode="svg"
+        if highlight_minimum:
+            volumes = model.volume_range()
+            energies = model.evaluate(volumes)
+            minimum = np.argmin(energies)
+            minima[0].append(volumes[minimum] / number_of_atoms)
+            minima[1].append(energies[minimum] / number_of_atoms)
+            minima[2].append(f"{row['config']} {row['EOS']}")
+
+    for group, (curve_x, curve_y, curve_labels) in curves.items():
+        fig.add_trace(
+            go.Scattergl(
+                x=np.concatenate(curve_x),
+                y=np.concatenate(curve_y),
+                mode="lines",
+                line=dict(width=1 if all_eos else 1.75, color=None if all_eos else group),
+                customdata=np.concatenate(curve_labels),
+                hovertemplate="%{customdata}<br>(%{x}, %{y})<extra></extra>",
+                name=f"{group} fit" if all_eos else f"{fits['EOS'].iloc[0]} fit",
+                legendgroup="eos" if all_eos else "data",
+                showlegend=False,
+            )
+        )
+
+    if minima[0]:
+        fig.add_trace(
+            go.Scattergl(
+                x=minima[0],
+                y=minima[1],
+                mode="markers",
+                marker=dict(color="black", size=marker_size, symbol="cross"),
+                customdata=minima[2],
+                hovertemplate="%{customdata} min energy<br>(%{x}, %{y})<extra></extra>",
+                name="min energy",
+                legendgroup="minimum",
+                showlegend=False,
+            )
+        )
+
+
 def plot_energy_difference(
     df,
     reference_config,
@@ -1776,12 +3131,13 @@ def plot_energy_difference(
     marker_alpha=1,
     cmap="plotly",
     marker_size=10,
+    render_mode="auto",
 ):
     """Takes a dataframe and plots the energy difference with respect to a reference configuration
     as a function of volume. Utilizes plot_ev() for the actual plotting.
 
     Args:
-        df (pandas.DataFrame): dataframe containing the volumes, energies, and number of atoms of each
+        df (pandas.DataFrame or EVDataset): dataframe containing the volumes, energies, and number of atoms of each
         configuration.
         reference_config (str): name of the configuration to be used as the reference state
         per_atom (bool, optional): Defaults to False.
@@ -1791,16 +3147,17 @@ def plot_energy_difference(
         marker_alpha (int, optional): Defaults to 1.
         cmap (str, optional): Defaults to 'plotly'.
         marker_size (int, optional): Defaults to 10.
+        render_mode (str, optional): "auto", "svg" or "webgl", see plot_ev. Defaults to "auto".
 
     Returns:
         fig (plotly.graph_objs._figure.Figure): A Plotly figure.
     """
 
-    df_list = []
-    for config in df["config"].unique():
-        df_list.append(df[df["config"] == config].reset_index(drop=True))
-        if config == reference_config:
-            reference_df = df[df["config"] == config].reset_index(drop=True)
+    dataset = df if isinstance(df, EVDataset) else EVDataset(df)
+    df_list = [config_df.reset_index() for _, config_df in dataset.per_config()]
+    reference_df = None
+    if reference_config in dataset:
+        reference_df = dataset.group(reference_config).reset_index()
 
     # Subtract reference energies
     missing_volumes = []
@@ -1818,7 +3175,10 @@ def plot_energy_difference(
     if missing_volumes:
         print(f"Warning: Missing volumes for configurations: {missing_volumes}")
 
-    energy_difference_df = pd.concat(df_list)
+    # energy_per_atom is recomputed from the energy differences by plot_ev
+    energy_difference_df = pd.concat(df_list).drop(
+        columns=["volume_rank", "energy_per_atom"], errors="ignore"
+    )
 
     if convert_to_mev == True:
         energy_difference_df["energy"] *= 1000
@@ -1833,6 +3193,7 @@ def plot_energy_difference(
         cmap=cmap,
         marker_alpha=marker_alpha,
         marker_size=marker_size,
+        render_mode=render_mode,
     )
 
     fig.update_layout(
@@ -1853,12 +3214,13 @@ def plot_energy_difference(
         fig.show()
 
     # Plot a horizontal line a y=0
+    volumes = np.concatenate([np.asarray(trace.x, dtype=float) for trace in fig.data])
     fig.add_shape(
         type="line",
         xref="x",
         yref="y",
-        x0=min(fig.data[0].x * 0.95),
-        x1=max(fig.data[0].x * 1.05),
+        x0=np.nanmin(volumes) * 0.95,
+        x1=np.nanmax(volumes) * 1.05,
         y0=0,
         y1=0,
         line=dict(
@@ -0,0 +1,199 @@
+"""
+Writes the figures of the plotting functions to PNG, SVG or HTML files without a display, e.g. in a batch job on a
+compute node, optionally from a process pool.
+
+The plotting functions (eos_fit.plot_ev, eos_fit.plot_energy_difference, eos_fit.plot_config_energy,
+qha_yphon.plot_quasi_harmonic, qha_yphon.plot_fit_harmonic, ...) are called with show_fig=False in the worker
+processes. A function may return one figure or a dict of figures, e.g. the panel set of plot_quasi_harmonic, which
+are written as <name>_<key>.<format>.
+
+Example:
+    export_per_config(eos_fit.plot_ev, df, "figures/ev", formats=["png", "html"], n_processes=8)
+    export_per_config(qha_yphon.plot_quasi_harmonic, qha_df, "figures/qha", n_processes=8, plot_type="all")
+
+PNG and SVG export needs kaleido ('pip install dfttk2[export]'), HTML export does not.
+"""
+
+# Standard library imports
+import concurrent.futures
+import os
+from collections.abc import Callable
+
+# Related third party imports
+import pandas as pd
+import plotly.graph_objects as go
+
+# DFTTK imports
+from dfttk.eos_fit import EVDataset
+
+FORMATS = ["png", "svg", "html"]
+
+
+def write_figure(
+    fig: go.Figure,
+    path: str,
+    formats: tuple[str, ...] = ("png",),
+    scale: float = 1,
+) -> list[str]:
+    """Writes a figure to path.<format> for each format.
+
+    Args:
+        fig (go.Figure): plotly figure
+        path (str): path of the files without the extension
+        formats (tuple[str, ...], optional): any of FORMATS. Defaults to ("png",).
+        scale (float, optional): scale factor of the PNG and SVG images. Defaults to 1.
+
+    Raises:
+        ValueError: if a format is not in FORMATS
+
+    Returns:
+        list[str]: paths of the written files
+    """
+
+    _check_formats(formats)
+    paths = []
+    for file_format in formats:
+        file_path = f"{path}.{file_format}"
+        if file_format == "html":
+            fig.write_html(file_path, include_plotlyjs="cdn")
+        else:
+            fig.write_image(file_path, format=file_format, scale=scale)
+        paths.append(file_path)
+    return paths
+
+
+def export_figures(
+    tasks: list[tuple],
+    output_directory: str,
+    formats: tuple[str, ...] = ("png",),
+    n_processes: int = 1,
+    scale: float = 1,
+) -> list[str]:
+    """Calls each plotting function with show_fig=False and writes its figures to output_directory.
+
+    Example:
+        export_figures(
+            [("config_energy", eos_fit.plot_config_energy, (df,), {}), ("ev_all", eos_fit.plot_ev, (df,), {})],
+            "figures",
+        )
+
+    Args:
+        tasks (list[tuple]): (name, plot_function, args, kwargs) per figure or set of figures. name is the file name
+        without the extension. plot_function must be importable by the worker processes (a module level function)
+        and accept show_fig, and args and kwargs must be picklable.
+        output_directory (str): directory of the files, created if needed
+        formats (tuple[str, ...], optional): any of FORMATS. Defaults to ("png",).
+        n_processes (int, optional): number of worker processes. None uses all cores. Defaults to 1.
+        scale (float, optional): scale factor of the PNG and SVG images. Defaults to 1.
+
+    Raises:
+        ValueError: if a format is not in FORMATS
+        ImportError: if PNG or SVG export is requested and kaleido is not installed
+
+    Returns:
+        list[str]: paths of the written files, in the order of tasks
+    """
+
+    _check_formats(formats)
+    if any(file_format != "html" for file_format in formats):
+        _import_kaleido()
+    if n_processes is None:
+        n_processes = os.cpu_count()
+    os.makedirs(output_directory, exist_ok=True)
+
+    arguments = [(task, output_directory, formats, scale) for task in tasks]
+    if n_processes == 1 or len(tasks) <= 1:
+        results = [_render_task(*argument) for argument in arguments]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = list(
+                executor.map(
+                    _render_task,
+                    *zip(*arguments),
+                    chunksize=max(1, len(tasks) // (4 * n_processes)),
+                )
+            )
+    return [path for paths in results for path in paths]
+
+
+def export_per_config(
+    plot_function: Callable,
+    df: pd.DataFrame | EVDataset,
+    output_directory: str,
+    formats: tuple[str, ...] = ("png",),
+    n_processes: int = 1,
+    scale: float = 1,
+    **plot_kwargs,
+) -> list[str]:
+    """Makes the figures of plot_function for each config of a results table, e.g. an EV plot per config with
+    eos_fit.plot_ev or a quasi-harmonic panel set per config with qha_yphon.plot_quasi_harmonic, and writes them to
+    output_directory/<plot_function name>_<config>[_<key>].<format>.
+
+    Args:
+        plot_function (Callable): module level plotting function that takes the rows of one config as its first
+        argument and accepts show_fig
+        df (pd.DataFrame | EVDataset): results of many configs with a 'config' column, e.g. the concatenated
+        quasi_harmonic results of each config with the config assigned
+        output_directory (str): directory of the files, created if needed
+        formats (tuple[str, ...], optional): any of FORMATS. Defaults to ("png",).
+        n_processes (int, optional): number of worker processes. None uses all cores. Defaults to 1.
+        scale (float, optional): scale factor of the PNG and SVG images. Defaults to 1.
+        **plot_kwargs: passed to plot_function, e.g. eos_fitting="mBM4" or plot_type="all"
+
+    Raises:
+        ValueError: if df has no 'config' column
+
+    Returns:
+        list[str]: paths of the written files
+    """
+
+    if isinstance(df, EVDataset):
+        df = df.to_frame()
+    if "config" not in df.columns:
+        raise ValueError("df must have a 'config' column")
+
+    tasks = [
+        (
+            f"{plot_function.__name__}_{str(config).replace(os.sep, '_')}",
+            plot_function,
+            (config_df,),
+            plot_kwargs,
+        )
+        for config, config_df in df.groupby("config", sort=False)
+    ]
+    return export_figures(
+        tasks, output_directory, formats=formats, n_processes=n_processes, scale=scale
+    )
+
+
+def _render_task(
+    task: tuple, output_directory: str, formats: tuple[str, ...], scale: float
+) -> list[str]:
+    name, plot_function, args, kwargs = task
+    figures = plot_function(*args, **{**kwargs, "show_fig": False})
+    if isinstance(figures, go.Figure):
+        figures = {None: figures}
+
+    paths = []
+    for key, fig in figures.items():
+        file_name = name if key is None else f"{name}_{key}"
+        paths += write_figure(
+            fig, os.path.join(output_directory, file_name), formats=formats, scale=scale
+        )
+    return paths
+
+
+def _check_formats(formats: tuple[str, ...]) -> None:
+    unknown_formats = [file_format for file_format in formats if file_format not in FORMATS]
+    if unknown_formats:
+        raise ValueError(f"Unknown formats {unknown_formats}, must be in {FORMATS}")
+
+
+def _import_kaleido():
+    try:
+        import kaleido
+    except ImportError as e:
+        raise ImportError(
+            "kaleido is required for PNG and SVG export. Install it with 'pip install dfttk2[export]'"
+        ) from e
+    return kaleido
@@ -0,0 +1,351 @@
+"""
+Fits a collinear Heisenberg (Ising) model to the energies of magnetic configurations and runs classical Monte Carlo
+with the fitted exchange constants to estimate finite-temperature magnetic properties.
+
+The model is
+
+    E/atom = E0 - sum_k J_k * Pi_k,     Pi_k = (1/N_atoms) * sum over pairs (i, j) in neighbour shell k of s_i * s_j
+
+with s_i = +1/-1 the spin direction of magnetic site i and each pair counted once, so J_k > 0 favours parallel spins.
+Neighbour shells are defined on distances normalized by (volume per atom)^(1/3), so configurations at slightly
+different volumes share the same shells.
+"""
+
+# Standard library imports
+import os
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+import scipy.constants
+
+# Local application/library specific imports
+from pymatgen.core.structure import Structure
+
+# DFTTK imports
+from dfttk.magnetism import get_magnetic_structure
+
+BOLTZMANN_CONSTANT = scipy.constants.Boltzmann / scipy.constants.electron_volt  # eV/K
+
+
+def load_magnetic_structures(
+    df: pd.DataFrame,
+    path: str,
+    contcar_name: str = "CONTCAR",
+    outcar_name: str = "OUTCAR",
+) -> dict[str, Structure]:
+    """Builds the magnetic structure (see magnetism.get_magnetic_structure) of each config in df, using the vol_*
+    directory of the volume in that row.
+
+    Args:
+        df: DataFrame with 'config' and 'volume' columns, one row per config, e.g. the lowest energy_per_atom
+        volume of each config from aggregate_extraction.extract_configuration_data
+        path: Path to "configurations" folder
+        contcar_name: name of the CONTCAR file. Defaults to "CONTCAR".
+        outcar_name: name of the OUTCAR file. Defaults to "OUTCAR".
+
+    Raises:
+        FileNotFoundError: if no vol_* directory of a config has a CONTCAR with the volume in df
+
+    Returns:
+        dict[str, Structure]: magnetic structures keyed on config
+    """
+
+    magnetic_structures = {}
+    for config, volume in zip(df["config"], df["volume"]):
+        config_dir = os.path.join(path, f"config_{config}")
+        for vol_dir in sorted(os.listdir(config_dir)):
+            contcar_path = os.path.join(config_dir, vol_dir, contcar_name)
+            if vol_dir.startswith("vol_") and os.path.isfile(contcar_path):
+                structure = Structure.from_file(contcar_path)
+                if np.isclose(structure.volume, volume, rtol=1e-6):
+                    magnetic_structures[config] = get_magnetic_structure(
+                        contcar_path, os.path.join(config_dir, vol_dir, outcar_name)
+                    )
+                    break
+        else:
+            raise FileNotFoundError(f"No {contcar_name} with volume {volume} in {config_dir}")
+    return magnetic_structures
+
+
+def shell_radii(
+    structure: Structure,
+    magnetic_species: list[str],
+    n_shells: int = 3,
+    shell_tol: float = 0.02,
+) -> np.ndarray:
+    """Normalized distances of the first n_shells neighbour shells between magnetic sites.
+
+    Args:
+        structure: structure (magnetic or not) of the parent lattice
+        magnetic_species: species carrying a magnetic moment, e.g. ["Fe", "Ni"]
+        n_shells: number of neighbour shells. Defaults to 3.
+        shell_tol: distances within shell_tol (in units of (volume per atom)^(1/3)) belong to the same shell.
+        Defaults to 0.02.
+
+    Returns:
+        np.ndarray: shell radii in units of (volume per atom)^(1/3)
+    """
+
+    length_scale = (structure.volume / structure.num_sites) ** (1 / 3)
+    cutoff = length_scale
+    while True:
+        _, _, distances = _magnetic_pairs(structure, magnetic_species, cutoff)
+        radii = _cluster(np.sort(distances / length_scale), shell_tol)
+        if len(radii) > n_shells or cutoff > 10 * length_scale:
+            return radii[:n_shells]
+        cutoff *= 1.5
+
+
+def pair_correlations(
+    magnetic_structures: dict[str, Structure],
+    magnetic_species: list[str],
+    radii: np.ndarray,
+    shell_tol: float = 0.02,
+    magmom_tolerance: float = 0.1,
+) -> pd.DataFrame:
+    """Spin pair correlations Pi_k of each configuration.
+
+    Args:
+        magnetic_structures: magnetic structures keyed on config, e.g. from load_magnetic_structures
+        magnetic_species: species carrying a magnetic moment, e.g. ["Fe", "Ni"]
+        radii: shell radii from shell_radii
+        shell_tol: see shell_radii. Defaults to 0.02.
+        magmom_tolerance: moments smaller than this are treated as zero spin. Defaults to 0.1.
+
+    Returns:
+        pd.DataFrame: indexed by config, with one column per shell ('J1', 'J2', ...)
+    """
+
+    rows = {}
+    for config, structure in magnetic_structures.items():
+        length_scale = (structure.volume / structure.num_sites) ** (1 / 3)
+        magmoms = np.array(structure.site_properties["magmom"], dtype=float)
+        spins = np.where(np.abs(magmoms) > magmom_tolerance, np.sign(magmoms), 0)
+
+        centers, neighbors, distances = _magnetic_pairs(
+            structure, magnetic_species, (radii[-1] + shell_tol) * length_scale
+        )
+        shell = _shell_index(distances / length_scale, radii, shell_tol)
+        products = spins[centers] * spins[neighbors]
+        # Every pair appears once from each of its sites
+        rows[config] = (
+            np.bincount(shell[shell >= 0], weights=products[shell >= 0], minlength=len(radii))
+            / 2
+            / structure.num_sites
+        )
+    return pd.DataFrame.from_dict(
+        rows, orient="index", columns=[f"J{k + 1}" for k in range(len(radii))]
+    )
+
+
+def fit_exchange_constants(
+    correlations: pd.DataFrame, energy_per_atom: pd.Series
+) -> pd.Series:
+    """Fits E0 and the exchange constants of all shells at once by linear least squares.
+
+    Args:
+        correlations: pair correlations from pair_correlations
+        energy_per_atom: energy per atom (eV) indexed by config
+
+    Raises:
+        ValueError: if there are fewer configurations than fitted parameters
+
+    Returns:
+        pd.Series: 'E0' (eV/atom), the exchange constants 'J1', 'J2', ... (eV) and the 'rms' of the residuals (eV/atom)
+    """
+
+    energy_per_atom = energy_per_atom.reindex(correlations.index)
+    if len(correlations) < correlations.shape[1] + 1:
+        raise ValueError(
+            f"{len(correlations)} configurations are not enough to fit {correlations.shape[1] + 1} parameters"
+        )
+    design = np.column_stack([np.ones(len(correlations)), -correlations.to_numpy()])
+    coefficients, _, _, _ = np.linalg.lstsq(design, energy_per_atom.to_numpy(), rcond=None)
+    residuals = energy_per_atom.to_numpy() - design @ coefficients
+    return pd.Series(
+        [*coefficients, np.sqrt(np.mean(residuals**2))],
+        index=["E0", *correlations.columns, "rms"],
+    )
+
+
+def monte_carlo(
+    structure: Structure,
+    magnetic_species: list[str],
+    radii: np.ndarray,
+    exchange_constants: pd.Series,
+    temperatures: np.ndarray,
+    supercell: list[int] = (8, 8, 8),
+    n_equilibration: int = 1000,
+    n_sweeps: int = 2000,
+    shell_tol: float = 0.02,
+    seed: int = None,
+) -> pd.DataFrame:
+    """Metropolis Monte Carlo of the fitted model on a supercell of the parent structure, for all temperatures at
+    once. The magnetic sites are split into groups without interactions between them (a checkerboard for bipartite
+    lattices) and each group is updated as one array operation.
+
+    The entropy and free energy are integrated from the heat capacity starting at the lowest temperature, so the
+    lowest temperature should be well below the transition temperature.
+
+    Args:
+        structure: structure of the parent lattice (not a magnetic configuration supercell)
+        magnetic_species: species carrying a magnetic moment, e.g. ["Fe", "Ni"]
+        radii: shell radii from shell_radii
+        exchange_constants: Series with 'J1', 'J2', ... from fit_exchange_constants
+        temperatures: temperatures in K
+        supercell: supercell of the parent structure used for the simulation. Defaults to (8, 8, 8).
+        n_equilibration: number of sweeps before measuring. Defaults to 1000.
+        n_sweeps: number of measured sweeps. Defaults to 2000.
+        shell_tol: see shell_radii. Defaults to 0.02.
+        seed: seed of the random number generator. Defaults to None.
+
+    Returns:
+        pd.DataFrame: per temperature, the magnetic 'energy', 'entropy' and 'free_energy' (eV/atom),
+        'heat_capacity' (kB/atom), the mean absolute 'magnetization' per magnetic site and the 'susceptibility'
+        (1/eV per magnetic site)
+    """
+
+    rng = np.random.default_rng(seed)
+    temperatures = np.asarray(temperatures, dtype=float)
+    beta = 1 / (BOLTZMANN_CONSTANT * temperatures)[:, None]
+
+    lattice = structure.copy()
+    lattice.make_supercell(supercell)
+    neighbors, couplings, magnetic_sites = _interaction_table(
+        lattice, magnetic_species, radii, exchange_constants, shell_tol
+    )
+    number_of_atoms = lattice.num_sites
+    number_of_spins = len(magnetic_sites)
+    groups = _independent_groups(neighbors)
+
+    spins = rng.choice([-1.0, 1.0], size=(len(temperatures), number_of_spins))
+    energies = np.zeros((n_sweeps, len(temperatures)))
+    magnetizations = np.zeros((n_sweeps, len(temperatures)))
+    for sweep in range(n_equilibration + n_sweeps):
+        for group in groups:
+            fields = (spins[:, neighbors[group]] * couplings[group]).sum(axis=2)
+            energy_change = 2 * spins[:, group] * fields
+            accept = rng.random(energy_change.shape) < np.exp(-beta * np.maximum(energy_change, 0))
+            spins[:, group] = np.where(accept, -spins[:, group], spins[:, group])
+        if sweep >= n_equilibration:
+            fields = (spins[:, neighbors] * couplings).sum(axis=2)
+            energies[sweep - n_equilibration] = -0.5 * (spins * fields).sum(axis=1)
+            magnetizations[sweep - n_equilibration] = np.abs(spins.mean(axis=1))
+
+    beta = beta[:, 0]
+    heat_capacity = beta**2 * energies.var(axis=0) / number_of_atoms
+    susceptibility = beta * number_of_spins * magnetizations.var(axis=0)
+    energy = energies.mean(axis=0) / number_of_atoms
+    # S(T) = integral of C/T dT, trapezoidal rule
+    heat_capacity_over_t = heat_capacity / temperatures
+    entropy = BOLTZMANN_CONSTANT * np.concatenate(
+        [[0], np.cumsum(np.diff(temperatures) * (heat_capacity_over_t[1:] + heat_capacity_over_t[:-1]) / 2)]
+    )
+    return pd.DataFrame(
+        {
+            "temperature": temperatures,
+            "energy": energy,
+            "heat_capacity": heat_capacity,
+            "entropy": entropy,
+            "free_energy": energy - temperatures * entropy,
+            "magnetization": magnetizations.mean(axis=0),
+            "susceptibility": susceptibility,
+        }
+    )
+
+
+def transition_temperature(monte_carlo_results: pd.DataFrame) -> float:
+    """Estimates the ordering (Curie or Neel) temperature as the temperature of the heat capacity peak, refined with
+    a parabola through the peak and its two neighbouring temperatures.
+
+    Args:
+        monte_carlo_results: DataFrame from monte_carlo
+
+    Returns:
+        float: transition temperature in K
+    """
+
+    temperatures = monte_carlo_results["temperature"].to_numpy()
+    heat_capacity = monte_carlo_results["heat_capacity"].to_numpy()
+    peak = int(np.argmax(heat_capacity))
+    if peak == 0 or peak == len(temperatures) - 1:
+        print("Warning: the heat capacity peak is at the edge of the temperature range")
+        return temperatures[peak]
+    a, b, _ = np.polyfit(temperatures[peak - 1 : peak + 2], heat_capacity[peak - 1 : peak + 2], 2)
+    return -b / (2 * a)
+
+
+def _magnetic_pairs(
+    structure: Structure, magnetic_species: list[str], cutoff: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Both directions of every magnetic pair within cutoff, excluding a site with its own periodic images
+    centers, neighbors, _, distances = structure.get_neighbor_list(cutoff)
+    is_magnetic = np.array([site.species_string in magnetic_species for site in structure])
+    keep = is_magnetic[centers] & is_magnetic[neighbors] & (distances > 1e-8)
+    return centers[keep], neighbors[keep], distances[keep]
+
+
+def _cluster(sorted_values: np.ndarray, tol: float) -> np.ndarray:
+    if len(sorted_values) == 0:
+        return sorted_values
+    breaks = np.flatnonzero(np.diff(sorted_values) > tol) + 1
+    return np.array([group.mean() for group in np.split(sorted_values, breaks)])
+
+
+def _shell_index(normalized_distances: np.ndarray, radii: np.ndarray, shell_tol: float) -> np.ndarray:
+    # Index of the shell of each distance, -1 if it is not within shell_tol of any shell
+    difference = np.abs(normalized_distances[:, None] - radii[None, :])
+    shell = np.argmin(difference, axis=1)
+    shell[difference[np.arange(len(shell)), shell] > shell_tol] = -1
+    return shell
+
+
+def _interaction_table(
+    lattice: Structure,
+    magnetic_species: list[str],
+    radii: np.ndarray,
+    exchange_constants: pd.Series,
+    shell_tol: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Padded neighbour and coupling arrays (n_spins x max_neighbors) over the magnetic sites of the lattice.
+    # Padding points to the site itself with a zero coupling.
+    length_scale = (lattice.volume / lattice.num_sites) ** (1 / 3)
+    magnetic_sites = np.array(
+        [i for i, site in enumerate(lattice) if site.species_string in magnetic_species]
+    )
+    spin_index = np.full(lattice.num_sites, -1)
+    spin_index[magnetic_sites] = np.arange(len(magnetic_sites))
+
+    centers, neighbors, distances = _magnetic_pairs(
+        lattice, magnetic_species, (radii[-1] + shell_tol) * length_scale
+    )
+    # Self-interactions through periodic images do not change when a spin flips
+    keep = centers != neighbors
+    centers, neighbors, distances = centers[keep], neighbors[keep], distances[keep]
+    shell = _shell_index(distances / length_scale, radii, shell_tol)
+    keep = shell >= 0
+    centers, neighbors, shell = spin_index[centers[keep]], spin_index[neighbors[keep]], shell[keep]
+    exchange = np.array([exchange_constants[f"J{k + 1}"] for k in range(len(radii))])
+
+    order = np.argsort(centers, kind="stable")
+    centers, neighbors, shell = centers[order], neighbors[order], shell[order]
+    counts = np.bincount(centers, minlength=len(magnetic_sites))
+    slots = np.arange(len(centers)) - np.repeat(np.cumsum(counts) - counts, counts)
+    neighbor_table = np.tile(np.arange(len(magnetic_sites))[:, None], (1, counts.max()))
+    coupling_table = np.zeros((len(magnetic_sites), counts.max()))
+    neighbor_table[centers, slots] = neighbors
+    coupling_table[centers, slots] = exchange[shell]
+    return neighbor_table, coupling_table, magnetic_sites
+
+
+def _independent_groups(neighbors: np.ndarray) -> list[np.ndarray]:
+    # Greedy colouring of the interaction graph, so that no two spins in a group interact
+    colors = np.full(len(neighbors), -1)
+    for site in range(len(neighbors)):
+        used = set(colors[neighbors[site]])
+        color = 0
+        while color in used:
+            color += 1
+        colors[site] = color
+    return [np.flatnonzero(colors == color) for color in range(colors.max() + 1)]
@@ -0,0 +1,256 @@
+"""
+Enumerates symmetry-distinct collinear spin configurations of a structure and writes them as config_* directories,
+as an alternative to generating the orderings with ATAT and removing the equivalent ones after the VASP runs.
+
+Supercells are enumerated as Hermite normal form matrices and reduced under the point group of the parent structure.
+For each supercell the spin assignments of the magnetic sites are canonicalized under the site permutations of the
+supercell space group combined with a global spin flip, so only one configuration per orbit is kept. Configurations
+that are periodic in a smaller supercell are left to that supercell.
+"""
+
+# Standard library imports
+import os
+import shutil
+
+# Related third party imports
+import numpy as np
+
+# Local application/library specific imports
+from pymatgen.core.structure import Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+
+def hermite_normal_forms(n: int) -> list[np.ndarray]:
+    """All lower triangular Hermite normal form matrices with determinant n. Each row is a supercell lattice vector
+    in the basis of the parent lattice, as in Structure.make_supercell.
+
+    Args:
+        n (int): number of parent cells in the supercell
+
+    Returns:
+        list[np.ndarray]: 3x3 integer matrices
+    """
+
+    matrices = []
+    for a in range(1, n + 1):
+        if n % a:
+            continue
+        for c in range(1, n // a + 1):
+            if (n // a) % c:
+                continue
+            f = n // (a * c)
+            for b in range(a):
+                for d in range(a):
+                    for e in range(c):
+                        matrices.append(np.array([[a, 0, 0], [b, c, 0], [d, e, f]]))
+    return matrices
+
+
+def supercell_matrices(
+    structure: Structure, n: int, symprec: float = 0.01
+) -> list[np.ndarray]:
+    """Supercell matrices of size n that are distinct under the point group of the structure.
+
+    Args:
+        structure (Structure): parent structure
+        n (int): number of parent cells in the supercell
+        symprec (float, optional): symmetry tolerance passed to SpacegroupAnalyzer. Defaults to 0.01.
+
+    Returns:
+        list[np.ndarray]: 3x3 integer matrices, one per symmetry-distinct supercell
+    """
+
+    rotations = _unique_rotations(
+        SpacegroupAnalyzer(structure, symprec=symprec).get_symmetry_operations(cartesian=False)
+    )
+    distinct = []
+    rotated_distinct = []
+    for matrix in hermite_normal_forms(n):
+        inverse = np.linalg.inv(matrix)
+        if any(
+            _is_integer(rotated @ inverse)
+            for rotated_matrices in rotated_distinct
+            for rotated in rotated_matrices
+        ):
+            continue
+        distinct.append(matrix)
+        rotated_distinct.append([matrix @ rotation.T for rotation in rotations])
+    return distinct
+
+
+def enumerate_collinear_configurations(
+    structure: Structure,
+    magnetic_species: dict[str, float],
+    max_cell_size: int = 1,
+    min_cell_size: int = 1,
+    symprec: float = 0.01,
+) -> list[Structure]:
+    """Enumerates the symmetry-distinct collinear (up/down) spin configurations of the magnetic sites of a structure
+    in all supercells from min_cell_size to max_cell_size parent cells.
+
+    Two configurations are equivalent if a space group operation of the supercell, optionally combined with flipping
+    all spins, maps one onto the other. Configurations that are periodic in a smaller supercell (e.g. FM in every
+    supercell larger than the parent cell) are only returned for that smaller supercell, so they are missing if
+    min_cell_size is larger than 1.
+
+    Args:
+        structure (Structure): parent structure
+        magnetic_species (dict[str, float]): magnitude of the magnetic moment of each magnetic species,
+        e.g. {"Fe": 5, "Ni": 2}. Other species get a magmom of 0.
+        max_cell_size (int, optional): largest supercell, in number of parent cells. Defaults to 1.
+        min_cell_size (int, optional): smallest supercell, in number of parent cells. Defaults to 1.
+        symprec (float, optional): symmetry tolerance passed to SpacegroupAnalyzer. Defaults to 0.01.
+
+    Raises:
+        ValueError: if none of the magnetic_species are in the structure
+
+    Returns:
+        list[Structure]: the supercells, sorted by species, with a 'magmom' site property
+    """
+
+    if not any(site.species_string in magnetic_species for site in structure):
+        raise ValueError(f"None of {list(magnetic_species)} are in the structure")
+
+    configurations = []
+    for n in range(min_cell_size, max_cell_size + 1):
+        for matrix in supercell_matrices(structure, n, symprec=symprec):
+            supercell = structure.copy()
+            supercell.make_supercell(matrix)
+            magnetic_sites = [
+                i for i, site in enumerate(supercell) if site.species_string in magnetic_species
+            ]
+            for spins in _distinct_spin_assignments(supercell, matrix, magnetic_sites, symprec):
+                magmoms = np.zeros(len(supercell))
+                magmoms[magnetic_sites] = [
+                    magnetic_species[supercell[i].species_string] for i in magnetic_sites
+                ]
+                magmoms[magnetic_sites] *= spins
+                magnetic_structure = supercell.copy()
+                magnetic_structure.add_site_property("magmom", magmoms.tolist())
+                configurations.append(magnetic_structure.get_sorted_structure())
+    return configurations
+
+
+def write_configurations(
+    configurations: list[Structure],
+    configurations_directory: str = "configurations",
+    incar: str = None,
+    first_config: int = 1,
+) -> list[str]:
+    """Writes each configuration to configurations_directory/config_<n>/POSCAR. If an INCAR is given, it is copied
+    to each config directory and the MAGMOM line of the configuration is appended, as in prep_for_vasp.make_incars.
+
+    Args:
+        configurations (list[Structure]): structures with a 'magmom' site property, e.g. from
+        enumerate_collinear_configurations
+        configurations_directory (str, optional): Defaults to "configurations".
+        incar (str, optional): path to the INCAR template. Defaults to None.
+        first_config (int, optional): number of the first config directory. Defaults to 1.
+
+    Raises:
+        FileExistsError: if a config directory already exists
+
+    Returns:
+        list[str]: paths of the config directories
+    """
+
+    config_dirs = []
+    for n, configuration in enumerate(configurations, start=first_config):
+        config_dir = os.path.join(configurations_directory, f"config_{n}")
+        os.makedirs(config_dir, exist_ok=False)
+        configuration.to(filename=os.path.join(config_dir, "POSCAR"), fmt="poscar")
+        if incar is not None:
+            incar_to = os.path.join(config_dir, "INCAR")
+            shutil.copy(incar, incar_to)
+            magmom_string = " ".join(
+                _format_magmom(magmom) for magmom in configuration.site_properties["magmom"]
+            )
+            with open(incar_to, "a") as file:
+                file.write(f"\nMAGMOM = {magmom_string}\n")
+        config_dirs.append(config_dir)
+    return config_dirs
+
+
+def _distinct_spin_assignments(
+    supercell: Structure,
+    matrix: np.ndarray,
+    magnetic_sites: list[int],
+    symprec: float,
+    chunk_size: int = 4096,
+) -> np.ndarray:
+    # Returns the canonical spin assignment (+1/-1 per magnetic site) of every orbit. An assignment is encoded as an
+    # integer with bit j set if magnetic site j is down, site 0 being the most significant bit. The canonical
+    # assignment of an orbit is the one with the smallest code over all permutations and the global spin flip, which
+    # always has site 0 up, so only the assignments with site 0 up are enumerated.
+    number_of_sites = len(magnetic_sites)
+    permutations, is_internal_translation = _magnetic_site_permutations(
+        supercell, matrix, magnetic_sites, symprec
+    )
+    weights = 2 ** np.arange(number_of_sites - 1, -1, -1, dtype=np.int64)
+    # code of the permuted assignment, where the spin of site j moves to site permutation[j]
+    permuted_weights = np.zeros((number_of_sites, len(permutations)), dtype=np.int64)
+    for k, permutation in enumerate(permutations):
+        permuted_weights[:, k] = weights[permutation]
+    translation_weights = permuted_weights[:, is_internal_translation]
+    all_down = 2**number_of_sites - 1
+
+    kept_codes = []
+    number_of_assignments = 2 ** (number_of_sites - 1)
+    for start in range(0, number_of_assignments, chunk_size):
+        codes = np.arange(start, min(start + chunk_size, number_of_assignments), dtype=np.int64)
+        bits = (codes[:, None] & weights[None, :]) != 0
+        permuted_codes = bits.astype(np.int64) @ permuted_weights
+        canonical = np.minimum(permuted_codes, all_down - permuted_codes).min(axis=1)
+        keep = canonical == codes
+        if translation_weights.shape[1]:
+            superperiodic = (bits.astype(np.int64) @ translation_weights == codes[:, None]).any(axis=1)
+            keep &= ~superperiodic
+        kept_codes.append(codes[keep])
+
+    codes = np.concatenate(kept_codes)
+    bits = (codes[:, None] & weights[None, :]) != 0
+    return np.where(bits, -1, 1)
+
+
+def _magnetic_site_permutations(
+    supercell: Structure, matrix: np.ndarray, magnetic_sites: list[int], symprec: float
+) -> tuple[list[np.ndarray], np.ndarray]:
+    # Permutations of the magnetic sites under the space group operations of the supercell, and whether each
+    # operation is a pure translation by a parent lattice vector that is not a supercell lattice vector
+    frac_coords = supercell.frac_coords[magnetic_sites]
+    operations = SpacegroupAnalyzer(supercell, symprec=symprec).get_symmetry_operations(cartesian=False)
+
+    permutations = []
+    is_internal_translation = []
+    for operation in operations:
+        new_coords = frac_coords @ operation.rotation_matrix.T + operation.translation_vector
+        difference = new_coords[:, None, :] - frac_coords[None, :, :]
+        difference -= np.round(difference)
+        distances = np.linalg.norm(difference @ supercell.lattice.matrix, axis=2)
+        permutations.append(np.argmin(distances, axis=1))
+
+        translation = operation.translation_vector - np.round(operation.translation_vector)
+        is_internal_translation.append(
+            np.allclose(operation.rotation_matrix, np.eye(3))
+            and not np.allclose(translation, 0, atol=symprec)
+            and _is_integer(translation @ matrix, atol=symprec)
+        )
+    return permutations, np.array(is_internal_translation, dtype=bool)
+
+
+def _unique_rotations(operations) -> list[np.ndarray]:
+    rotations = {}
+    for operation in operations:
+        rotation = np.round(operation.rotation_matrix).astype(int)
+        rotations[rotation.tobytes()] = rotation
+    return list(rotations.values())
+
+
+def _is_integer(array: np.ndarray, atol: float = 1e-6) -> bool:
+    return np.allclose(array, np.round(array), atol=atol)
+
+
+def _format_magmom(magmom: float) -> str:
+    if float(magmom).is_integer():
+        return str(int(magmom))
+    return str(magmom)
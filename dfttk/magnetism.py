@@ -1,20 +1,24 @@
 # Standard library imports
+import collections
+import concurrent.futures
+import json
 import os
 
 # Related third party imports
 import numpy as np
 import pandas as pd
-import itertools
 import numbers
 
 # Local application/library specific imports
 from pymatgen.core.structure import Structure
 from pymatgen.analysis.magnetism.analyzer import \
     CollinearMagneticStructureAnalyzer as CMSA
+from pymatgen.analysis.magnetism.analyzer import DEFAULT_MAGMOMS
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
 # DFTTK imports
 from dfttk.data_extraction import (
-    extract_tot_mag_data, extract_input_mag_data
+    extract_tot_mag_data, extract_input_and_tot_mag_data
 )
 
 
@@ -51,6 +55,192 @@ def determine_magnetic_ordering(
     else:
         return "SF"
 
+def _tot_as_float64(mag_table: pd.DataFrame) -> np.ndarray:
+    # The OUTCAR prints moments with 3 decimals. Rounding the float32 values back removes the float32
+    # representation error so sums compare against small tolerances the same way as the parsed values.
+    return np.round(mag_table["tot"].to_numpy(dtype=np.float64), 6)
+
+
+def total_magnetic_moments(mag_table: pd.DataFrame) -> pd.Series:
+    """Sums the 'tot' magnetic moments of each (config, volume) in a long magnetization table.
+
+    Args:
+        mag_table: long magnetization table from extract_configuration_data(return_mag_table=True)
+        or data_extraction.mag_data_to_mag_table
+
+    Returns:
+        pd.Series: total magnetic moment indexed by (config, volume)
+    """
+
+    tot = pd.Series(
+        _tot_as_float64(mag_table),
+        index=pd.MultiIndex.from_frame(mag_table[["config", "volume"]]),
+        name="total_magnetic_moment",
+    )
+    return tot.groupby(level=["config", "volume"], sort=False).sum()
+
+
+def determine_magnetic_orderings(
+    mag_table: pd.DataFrame,
+    magmom_tolerance: float | dict[str, float] = 1e-12,
+    total_magnetic_moment_tolerance: float = 1e-12,
+) -> pd.Series:
+    """Grouped version of determine_magnetic_ordering. Classifies every (config, volume) in a long
+    magnetization table as 'NM', 'AFM', 'FM', 'FiM' or 'SF' in one pass, with the same tolerance semantics.
+
+    Args:
+        mag_table: long magnetization table from extract_configuration_data(return_mag_table=True)
+        or data_extraction.mag_data_to_mag_table
+        magmom_tolerance (float or dict, optional): the tolerance for the total magnetic moment on each atom to be considered zero.
+        A dict gives the tolerance per species, e.g. {"Fe": 0.1, "Al": 0.05}, and needs a 'species' column in mag_table.
+        total_magnetic_moment_tolerance (float, optional): the tolerance for the sum of the total magnetic moments for each atom.
+        Defaults to 1e-12 to handle floating point errors.
+
+    Raises:
+        ValueError: if magmom_tolerance is a dict and mag_table has no 'species' column or a species is missing from it
+
+    Returns:
+        pd.Series: magnetic ordering indexed by (config, volume)
+    """
+
+    if isinstance(magmom_tolerance, dict):
+        if "species" not in mag_table.columns:
+            raise ValueError("A per-species magmom_tolerance needs a 'species' column in mag_table")
+        species_tolerance = mag_table["species"].map(magmom_tolerance)
+        if species_tolerance.isna().any():
+            missing_species = sorted(set(mag_table["species"][species_tolerance.isna()]))
+            raise ValueError(f"No magmom_tolerance given for species {missing_species}")
+        magmom_tolerance = species_tolerance.to_numpy(dtype=np.float64)
+
+    tot = _tot_as_float64(mag_table)
+    flags = pd.DataFrame(
+        {
+            "tot": tot,
+            "zero": np.abs(tot) <= magmom_tolerance,
+            "up": tot >= magmom_tolerance,
+            "down": tot <= -magmom_tolerance,
+            "strictly_up": tot > magmom_tolerance,
+            "strictly_down": tot < -magmom_tolerance,
+        },
+        index=pd.MultiIndex.from_frame(mag_table[["config", "volume"]]),
+    )
+    grouped = flags.groupby(level=["config", "volume"], sort=False)
+    counts = grouped[["zero", "up", "down", "strictly_up", "strictly_down"]].sum()
+    number_of_ions = grouped.size()
+    total = grouped["tot"].sum()
+
+    ordering = np.select(
+        [
+            counts["zero"] == number_of_ions,
+            np.abs(total) <= total_magnetic_moment_tolerance,
+            (counts["up"] == number_of_ions) | (counts["down"] == number_of_ions),
+            counts["strictly_up"] == counts["strictly_down"],
+        ],
+        ["NM", "AFM", "FM", "FiM"],
+        default="SF",
+    )
+    return pd.Series(ordering, index=counts.index, name="magnetic_ordering")
+
+
+def magnetic_transitions(
+    mag_table: pd.DataFrame,
+    moment_change_tolerance: float = 0.5,
+    magmom_tolerance: float | dict[str, float] = 1e-12,
+    total_magnetic_moment_tolerance: float = 1e-12,
+) -> pd.DataFrame:
+    """Finds, for every config of a long magnetization table, the volumes where the magnetic ordering or the
+    moment of any ion changes with respect to the next smaller volume, and marks the volumes to exclude from the
+    EOS fit. All configs are handled with grouped operations.
+
+    A transition splits the volumes of a config into segments. The longest segment is kept (the one with the
+    smaller volumes on a tie) and the volumes of the other segments get exclude = True. The result can be merged
+    into the configuration data with exclude_magnetic_transitions, and eos_fit.fit_to_all_eos skips the excluded
+    volumes.
+
+    Args:
+        mag_table: long magnetization table from extract_configuration_data(return_mag_table=True)
+        or data_extraction.mag_data_to_mag_table
+        moment_change_tolerance (float, optional): largest change in the moment of an ion between neighbouring
+        volumes that is not a transition. Defaults to 0.5.
+        magmom_tolerance (float or dict, optional): see determine_magnetic_orderings. Defaults to 1e-12.
+        total_magnetic_moment_tolerance (float, optional): see determine_magnetic_orderings. Defaults to 1e-12.
+
+    Returns:
+        pd.DataFrame: indexed by (config, volume), sorted by volume within each config, with the columns
+        'magnetic_ordering', 'ordering_change', 'max_moment_change', 'moment_change', 'transition', 'segment' and
+        'exclude'
+    """
+
+    orderings = determine_magnetic_orderings(
+        mag_table,
+        magmom_tolerance=magmom_tolerance,
+        total_magnetic_moment_tolerance=total_magnetic_moment_tolerance,
+    )
+
+    ions = pd.DataFrame(
+        {
+            "config": mag_table["config"].to_numpy(),
+            "volume": mag_table["volume"].to_numpy(),
+            "ion": mag_table["ion"].to_numpy(),
+            "tot": _tot_as_float64(mag_table),
+        }
+    ).sort_values(["config", "volume", "ion"], kind="stable")
+    ions["moment_change"] = ions.groupby(["config", "ion"], sort=False)["tot"].diff().abs()
+    max_moment_change = ions.groupby(["config", "volume"], sort=False)["moment_change"].max()
+
+    transitions = orderings.to_frame().join(max_moment_change.rename("max_moment_change"))
+    transitions = transitions.sort_index(level=["config", "volume"], sort_remaining=False)
+    by_config = transitions.groupby(level="config", sort=False)
+    previous_ordering = by_config["magnetic_ordering"].shift()
+    transitions["ordering_change"] = previous_ordering.notna() & (
+        transitions["magnetic_ordering"] != previous_ordering
+    )
+    transitions["moment_change"] = transitions["max_moment_change"] > moment_change_tolerance
+    transitions["transition"] = transitions["ordering_change"] | transitions["moment_change"]
+    transitions["segment"] = transitions.groupby(level="config", sort=False)["transition"].cumsum()
+
+    segment_sizes = transitions.groupby(["config", "segment"], sort=False).size()
+    kept_segment = segment_sizes.groupby(level="config", sort=False).idxmax().str[1]
+    transitions["exclude"] = transitions["segment"].to_numpy() != kept_segment.reindex(
+        transitions.index.get_level_values("config")
+    ).to_numpy()
+
+    return transitions[
+        [
+            "magnetic_ordering",
+            "ordering_change",
+            "max_moment_change",
+            "moment_change",
+            "transition",
+            "segment",
+            "exclude",
+        ]
+    ]
+
+
+def exclude_magnetic_transitions(
+    df: pd.DataFrame, transitions: pd.DataFrame
+) -> pd.DataFrame:
+    """Copies the 'exclude' flags of magnetic_transitions into the configuration data, so that
+    eos_fit.fit_to_all_eos skips those volumes. Volumes without magnetic data are not excluded.
+
+    Args:
+        df: DataFrame from extract_configuration_data with the columns 'config' and 'volume'
+        transitions: DataFrame from magnetic_transitions
+
+    Returns:
+        pd.DataFrame: a copy of df with an 'exclude' column. An existing 'exclude' column is combined with a logical or.
+    """
+
+    keys = pd.MultiIndex.from_frame(df[["config", "volume"]])
+    exclude = transitions["exclude"].reindex(keys).fillna(False).to_numpy(dtype=bool)
+    df = df.copy()
+    if "exclude" in df.columns:
+        exclude |= df["exclude"].fillna(False).to_numpy(dtype=bool)
+    df["exclude"] = exclude
+    return df
+
+
 def get_magnetic_structure(poscar: str, outcar: str) -> Structure:
     """Combines the magmom data from the outcar with the structure from the poscar
     to return a pymatgen magnetic Structures object (e.g. Structures with
@@ -68,112 +258,576 @@ def get_magnetic_structure(poscar: str, outcar: str) -> Structure:
     structure.add_site_property("magmom", mag_data["tot"])
     return structure
 
+def magnetic_fingerprint(
+    magnetic_structure: Structure, symprec: float = None
+) -> tuple:
+    """Cheap invariant of the magnetic ordering of a structure, used to bucket configurations before running
+    CollinearMagneticStructureAnalyzer.matches_ordering. Structures with different fingerprints never match.
+
+    The fingerprint is the reduced formula and the reduced counts of up, down and zero spins per species,
+    using the same thresholds and sign normalization as matches_ordering, taken in the canonical
+    orientation with respect to a global spin flip.
+
+    Args:
+        magnetic_structure: pymatgen Structure with magmom site properties (see get_magnetic_structure)
+        symprec: if given, also include the space group number of the spin-decorated structure found with
+        this symprec. This prunes more pairs, but relaxed structures that StructureMatcher still considers
+        equivalent can have different space groups at tight symprec. Defaults to None.
+
+    Returns:
+        tuple: hashable fingerprint
+    """
+
+    spins = _spin_signs(magnetic_structure)
+    species = [site.species_string for site in magnetic_structure]
+
+    counts = collections.Counter(zip(species, spins))
+    divisor = np.gcd.reduce(list(counts.values()))
+    spin_counts = tuple(sorted((sp, spin, int(n // divisor)) for (sp, spin), n in counts.items()))
+    flipped_spin_counts = tuple(
+        sorted((sp, -spin, n) for sp, spin, n in spin_counts)
+    )
+    fingerprint = (
+        magnetic_structure.composition.reduced_formula,
+        min(spin_counts, flipped_spin_counts),
+    )
+
+    if symprec is not None:
+        spin_structure = magnetic_structure.copy()
+        spin_structure.remove_site_property("magmom")
+        spin_structure.add_spin_by_site(spins)
+        space_group = SpacegroupAnalyzer(
+            spin_structure, symprec=symprec
+        ).get_space_group_number()
+        fingerprint += (space_group,)
+
+    return fingerprint
+
+
+def _spin_signs(magnetic_structure: Structure) -> list[int]:
+    # Same thresholds as CollinearMagneticStructureAnalyzer with overwrite_magmom_mode="normalize":
+    # moments of magnetic species are zero only if exactly zero, other species use threshold_nonmag = 0.1
+    spins = []
+    for magmom, site in zip(
+        magnetic_structure.site_properties["magmom"], magnetic_structure
+    ):
+        magmom = float(magmom or 0)
+        if site.species_string in DEFAULT_MAGMOMS:
+            threshold = 0
+        else:
+            threshold = 0.1
+        spins.append(int(np.sign(magmom)) if abs(magmom) > threshold else 0)
+    return spins
+
+
+def _load_magnetic_structure(
+    config_dir_path: str, contcar_name: str, outcar_name: str
+) -> tuple[Structure, str]:
+    # Returns the magnetic structure of the first vol_ directory with readable CONTCAR/OUTCAR files and the
+    # name of that directory
+    for subdir in os.listdir(config_dir_path):
+        subdir_path = os.path.join(config_dir_path, subdir)
+        if os.path.isdir(subdir_path) and subdir.startswith("vol_"):
+            try:
+                magnetic_structure = get_magnetic_structure(
+                    os.path.join(subdir_path, contcar_name),
+                    os.path.join(subdir_path, outcar_name)
+                )
+                return magnetic_structure, subdir
+            except FileNotFoundError as e:
+                print(f"missing CONTCAR/OUTCAR in {subdir_path}: {e}. Did you use the correct CONTCAR/OUTCAR name?")
+    raise FileNotFoundError(f"Could not make magnetic structure for config in {config_dir_path}")
+
+
+def _config_dirs(path: str) -> dict[str, str]:
+    return {
+        config_dir.split("config_")[1]: os.path.join(path, config_dir)
+        for config_dir in os.listdir(path)
+        if config_dir.startswith("config_") and os.path.isdir(os.path.join(path, config_dir))
+    }
+
+
+def _load_magnetic_structures(
+    path: str, contcar_name: str, outcar_name: str
+) -> dict[str, Structure]:
+    struct_dict = {}
+    for config, config_dir_path in _config_dirs(path).items():
+        struct_dict[config], _ = _load_magnetic_structure(
+            config_dir_path, contcar_name, outcar_name
+        )
+    return struct_dict
+
+
+def _matching_structures(magnetic_structure: Structure) -> tuple[Structure, Structure, Structure]:
+    # Builds the spin-decorated structures that CollinearMagneticStructureAnalyzer.matches_ordering compares,
+    # so they are made once per config instead of once per pair. Returns the structure used when the config
+    # is the analyzer and the positive and negative structures used when it is the other structure.
+    reference = CMSA(
+        CMSA(magnetic_structure).structure, overwrite_magmom_mode="normalize"
+    ).get_structure_with_spin()
+
+    positive = CMSA(
+        magnetic_structure, overwrite_magmom_mode="normalize", make_primitive=False
+    )
+    negative_structure = positive.structure.copy()
+    negative_structure.add_site_property(
+        "magmom", -np.array(negative_structure.site_properties["magmom"])
+    )
+    negative = CMSA(
+        negative_structure, overwrite_magmom_mode="normalize", make_primitive=False
+    )
+    return reference, positive.get_structure_with_spin(), negative.get_structure_with_spin()
+
+
+def _match_pairs(
+    struct_dict: dict[str, Structure], pairs: list[tuple[str, str]]
+) -> list[tuple[str, str]]:
+    matching_structures = {
+        config: _matching_structures(magnetic_structure)
+        for config, magnetic_structure in struct_dict.items()
+    }
+    matched_pairs = []
+    for config, other_config in pairs:
+        reference, _, _ = matching_structures[config]
+        _, positive, negative = matching_structures[other_config]
+        if reference.matches(positive) or reference.matches(negative):
+            matched_pairs.append((config, other_config))
+    return matched_pairs
+
+
+def _find_matching_pairs(
+    struct_dict: dict[str, Structure],
+    pairs: list[tuple[str, str]],
+    n_processes: int,
+    chunk_size: int,
+) -> set[tuple[str, str]]:
+    if n_processes == 1 or len(pairs) <= 1:
+        return set(_match_pairs(struct_dict, pairs))
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(pairs) // (4 * n_processes)))
+
+    # Each chunk only carries the structures of its own configs, which the worker processes once
+    chunks = []
+    for start in range(0, len(pairs), chunk_size):
+        chunk_pairs = pairs[start : start + chunk_size]
+        chunk_configs = {config for pair in chunk_pairs for config in pair}
+        chunk_struct_dict = {config: struct_dict[config] for config in chunk_configs}
+        chunks.append((chunk_struct_dict, chunk_pairs))
+
+    matched_pairs = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_processes) as executor:
+        futures = [executor.submit(_match_pairs, *chunk) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            matched_pairs.update(future.result())
+    return matched_pairs
+
+
 #TODO: make this magnetic/non-magnetic agnostic
 def equivalent_orderings(path: str,
                          contcar_name: str ='CONTCAR',
-                         outcar_name: str = 'OUTCAR'
-) -> bool:
-    """finds equivalent magnetic orderings for a set of configurations in a path
-    Works rather slow. Needs to be optimized. 350 configurations takes about 10 minutes.
+                         outcar_name: str = 'OUTCAR',
+                         symprec: float = None,
+                         n_processes: int = 1,
+                         chunk_size: int = None,
+) -> dict:
+    """finds equivalent magnetic orderings for a set of configurations in a path.
+    Configurations are first bucketed by magnetic_fingerprint and the magnetic orderings are only compared
+    (as in CollinearMagneticStructureAnalyzer.matches_ordering) for pairs within the same bucket. The pair
+    comparisons can be distributed over a process pool.
 
     Args:
         path: Path to "configurations" folder
         contcar_name: name of the CONTCAR file. Defaults to 'CONTCAR'.
         outcar_name: name of the OUTCAR file. Defaults to 'OUTCAR'.
+        symprec: passed to magnetic_fingerprint to also bucket by magnetic space group. Defaults to None.
+        n_processes: number of worker processes for the pair comparisons. None uses all cores. Defaults to 1.
+        chunk_size: number of pairs sent to a worker at a time. Defaults to None, which splits the pairs
+        into about 4 chunks per process.
 
     Raises:
         FileNotFoundError: if the contcar/outcar files are not found for a config
 
     Returns:
         a dictionary where the keys are the configurations and the values are lists of configurations with matching magnetic ordering
-    """    
-    struct_dict = {}
-    for config_dir in os.listdir(path):
-        config_dir_path = os.path.join(path, config_dir)
-        if os.path.isdir(config_dir_path) and config_dir.startswith("config_"):
-            for subdir in os.listdir(config_dir_path):
-                subdir_path = os.path.join(config_dir_path, subdir)
-                if os.path.isdir(subdir_path) and subdir.startswith("vol_"):
-                    try:
-                        magnetic_structure = get_magnetic_structure(
-                            os.path.join(subdir_path, contcar_name),
-                            os.path.join(subdir_path, outcar_name)
-                        )
-                        config = config_dir.split("config_")[1]
-                        struct_dict[config] = magnetic_structure
-                        structure_found = True
-                        break
-                    except FileNotFoundError as e:
-                        print(f"missing CONTCAR/OUTCAR in {subdir_path}: {e}. Did you use the correct CONTCAR/OUTCAR name?")
-            if not structure_found:
-                raise FileNotFoundError(f"Could not make magnetic structure for config in {config_dir_path}")    
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count()
+
+    struct_dict = _load_magnetic_structures(path, contcar_name, outcar_name)
+
+    buckets = collections.defaultdict(list)
+    for config, magnetic_structure in struct_dict.items():
+        buckets[magnetic_fingerprint(magnetic_structure, symprec=symprec)].append(config)
+
+    pairs = [
+        (config, remaining_config)
+        for bucket in buckets.values()
+        for i, config in enumerate(bucket)
+        for remaining_config in bucket[i + 1:]
+    ]
+    matched_pairs = _find_matching_pairs(struct_dict, pairs, n_processes, chunk_size)
+
     equivalence_dict = {config: [] for config in struct_dict.keys()}
-    items = struct_dict.items()
-    for i, (config, magnetic_structure) in enumerate(items):
-        analyzer = CMSA(magnetic_structure)
-        for remaining_config, remaining_magnetic_structure in itertools.islice(
-            items,
-            i+1,
-            len(struct_dict)
-            ):
-            if analyzer.matches_ordering(remaining_magnetic_structure):
-                equivalence_dict[config].append(remaining_config)
-                equivalence_dict[remaining_config].append(config)
+    for config, remaining_config in pairs:
+        if (config, remaining_config) in matched_pairs:
+            equivalence_dict[config].append(remaining_config)
+            equivalence_dict[remaining_config].append(config)
     return equivalence_dict
 
+def equivalence_classes(equivalence_dict: dict) -> dict[str, str]:
+    """Groups configurations into disjoint equivalence classes (union-find) from the pairs in an
+    equivalence_dict. Each pair only needs to be listed in one direction.
+
+    Args:
+        equivalence_dict: dictionary from equivalent_orderings, where the keys are the configurations and the
+        values are lists of configurations with matching magnetic ordering
+
+    Returns:
+        dict: maps every configuration to the canonical representative of its class, which is the first
+        configuration of the class in the order of equivalence_dict
+    """
+
+    order = {config: i for i, config in enumerate(equivalence_dict)}
+    parent = {config: config for config in equivalence_dict}
+
+    def find(config):
+        while parent[config] != config:
+            parent[config] = parent[parent[config]]
+            config = parent[config]
+        return config
+
+    for config, matching_configs in equivalence_dict.items():
+        for matching_config in matching_configs:
+            if matching_config not in parent:
+                order[matching_config] = len(order)
+                parent[matching_config] = matching_config
+            root, matching_root = find(config), find(matching_config)
+            if root != matching_root:
+                if order[matching_root] < order[root]:
+                    root, matching_root = matching_root, root
+                parent[matching_root] = root
+
+    return {config: find(config) for config in parent}
+
+
+EQUIVALENCE_CACHE_VERSION = 1
+
+
+def cached_equivalence_classes(
+    path: str,
+    cache_path: str = None,
+    contcar_name: str = 'CONTCAR',
+    outcar_name: str = 'OUTCAR',
+    symprec: float = None,
+    n_processes: int = 1,
+    chunk_size: int = None,
+) -> dict[str, str]:
+    """Incremental version of equivalence_classes(equivalent_orderings(path)). The classes, the magnetic
+    fingerprints and the sizes and modification times of the CONTCAR/OUTCAR files used for each config are
+    saved to a JSON cache, together with the magnetic structures of the class representatives.
+
+    On later calls only new configs and configs whose files changed are read. They are compared against the
+    representatives of the existing classes with the same fingerprint and against each other. Configs that
+    were removed or changed are dropped from their class, and if one of them was the representative the next
+    member of the class takes its place.
+
+    Args:
+        path: Path to "configurations" folder
+        cache_path: path to the cache file. Defaults to None, which uses path/magnetic_equivalence_cache.json
+        contcar_name: name of the CONTCAR file. Defaults to 'CONTCAR'.
+        outcar_name: name of the OUTCAR file. Defaults to 'OUTCAR'.
+        symprec: passed to magnetic_fingerprint. Defaults to None.
+        n_processes: number of worker processes for the pair comparisons. None uses all cores. Defaults to 1.
+        chunk_size: number of pairs sent to a worker at a time. Defaults to None.
+
+    Raises:
+        FileNotFoundError: if the contcar/outcar files are not found for a config
+
+    Returns:
+        dict: maps every configuration to the representative of its class, as in equivalence_classes
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count()
+    if cache_path is None:
+        cache_path = os.path.join(path, "magnetic_equivalence_cache.json")
+
+    settings = {
+        "version": EQUIVALENCE_CACHE_VERSION,
+        "contcar_name": contcar_name,
+        "outcar_name": outcar_name,
+        "symprec": symprec,
+    }
+    entries, cached_structures = {}, {}
+    if os.path.isfile(cache_path):
+        with open(cache_path) as file:
+            cache = json.load(file)
+        if cache["settings"] == settings:
+            entries = cache["configs"]
+            cached_structures = cache["structures"]
+        else:
+            print(f"{cache_path} was made with different settings, rebuilding it")
+
+    # Drop removed configs and configs whose CONTCAR/OUTCAR changed
+    config_dirs = _config_dirs(path)
+    entries = {
+        config: entry
+        for config, entry in entries.items()
+        if config in config_dirs
+        and entry["files"] == _file_fingerprints(
+            os.path.join(config_dirs[config], entry["vol_dir"]), contcar_name, outcar_name
+        )
+    }
+
+    members = collections.defaultdict(list)
+    for config, entry in entries.items():
+        members[entry["representative"]].append(config)
+
+    struct_dict = {}
+    for representative, class_members in members.items():
+        if representative not in entries:
+            representative = class_members[0]
+            for config in class_members:
+                entries[config]["representative"] = representative
+        if representative in cached_structures:
+            struct_dict[representative] = Structure.from_dict(cached_structures[representative])
+        else:
+            vol_dir_path = os.path.join(config_dirs[representative], entries[representative]["vol_dir"])
+            struct_dict[representative] = get_magnetic_structure(
+                os.path.join(vol_dir_path, contcar_name),
+                os.path.join(vol_dir_path, outcar_name)
+            )
+
+    buckets = collections.defaultdict(list)
+    for representative in struct_dict:
+        buckets[json.dumps(entries[representative]["fingerprint"])].append(representative)
+
+    new_configs = [config for config in config_dirs if config not in entries]
+    pairs = []
+    for config in new_configs:
+        magnetic_structure, vol_dir = _load_magnetic_structure(
+            config_dirs[config], contcar_name, outcar_name
+        )
+        struct_dict[config] = magnetic_structure
+        entries[config] = {
+            "vol_dir": vol_dir,
+            "files": _file_fingerprints(
+                os.path.join(config_dirs[config], vol_dir), contcar_name, outcar_name
+            ),
+            "fingerprint": magnetic_fingerprint(magnetic_structure, symprec=symprec),
+            "representative": config,
+        }
+        bucket = buckets[json.dumps(entries[config]["fingerprint"])]
+        pairs.extend((other_config, config) for other_config in bucket)
+        bucket.append(config)
+
+    matched_pairs = _find_matching_pairs(struct_dict, pairs, n_processes, chunk_size)
+    equivalence_dict = {config: [] for config in struct_dict}
+    for config, other_config in pairs:
+        if (config, other_config) in matched_pairs:
+            equivalence_dict[config].append(other_config)
+    representatives = equivalence_classes(equivalence_dict)
+    for entry in entries.values():
+        entry["representative"] = representatives[entry["representative"]]
+
+    cache = {
+        "settings": settings,
+        "configs": entries,
+        "structures": {
+            representative: struct_dict[representative].as_dict()
+            for representative in set(representatives.values())
+        },
+    }
+    temporary_cache_path = cache_path + ".tmp"
+    with open(temporary_cache_path, "w") as file:
+        json.dump(cache, file)
+    os.replace(temporary_cache_path, cache_path)
+
+    return {config: entry["representative"] for config, entry in entries.items()}
+
+
+def _file_fingerprints(vol_dir_path: str, contcar_name: str, outcar_name: str) -> list:
+    fingerprints = []
+    for file_name in [contcar_name, outcar_name]:
+        try:
+            stat = os.stat(os.path.join(vol_dir_path, file_name))
+        except FileNotFoundError:
+            return None
+        fingerprints.append([stat.st_size, stat.st_mtime_ns])
+    return fingerprints
+
+
 def remove_equivalent_orderings(
     df: pd.DataFrame,
     equivalence_dict: dict
 ) -> pd.DataFrame:
-    remove_list = []
-    sorted_df = df.sort_values(by='energy_per_atom')
-    for index, row in sorted_df.iterrows():
-        if row['config'] in remove_list:
-            continue
-        elif equivalence_dict[row['config']] == []:
-            continue
-        else:
-            remove_list.extend(equivalence_dict[row['config']])
-    
-    #keep rows that are not in the remove_list
-    return df[~df['config'].isin(remove_list)]
-
-#TODO: support specify min and max for each ion (dict) and min/max (tuple) for
-# magmom_tol. it may be beneficial to have a range of acceptable values instead
-# a tolerance.
+    """Keeps only the lowest energy configuration of each class of equivalent magnetic orderings. All rows
+    (volumes) of the kept configurations are returned. Configurations missing from equivalence_dict are
+    treated as their own class.
+
+    Args:
+        df: DataFrame with 'config' and 'energy_per_atom' columns
+        equivalence_dict: dictionary from equivalent_orderings, or the mapping from equivalence_classes
+
+    Returns:
+        pd.DataFrame: the rows of df belonging to the kept configurations
+    """
+    if all(isinstance(value, str) for value in equivalence_dict.values()):
+        classes = equivalence_dict
+    else:
+        classes = equivalence_classes(equivalence_dict)
+
+    config_class = df["config"].map(classes).fillna(df["config"])
+    lowest_energy_index = df.groupby(config_class, sort=False)["energy_per_atom"].idxmin()
+    kept_configs = df.loc[lowest_energy_index.dropna(), "config"]
+    return df[df["config"].isin(kept_configs)]
+
 def significant_magmom_change(
     outcar_path: str = "OUTCAR",
-    magmom_tol: float = 0.5
+    magmom_tol: float | tuple[float, float] | dict = 0.5
 ) -> bool:
     """determines if the resulting magnetic moment is significantly different from the input magnetic moment for any of the atoms.
+    The input and resulting magnetic moments are read from the OUTCAR in a single pass.
+
+    magmom_tol can be:
+        a real number: the resulting moment must be within input +/- magmom_tol
+        a (min, max) tuple: the change (resulting - input) must be within [min, max], e.g. (-0.5, 0.2)
+        a dict: tolerances (real numbers or tuples) per species, e.g. {"Fe": 0.5, "Al": (-0.1, 0.1)}, and/or
+        per ion, keyed on the ion number as in the OUTCAR, e.g. {1: (-1, 0.5)}. Ion keys take precedence.
 
     Args:
         outcar_path: Path to the OUTCAR. Defaults to "OUTCAR".
         magmom_tol: tolerance for change in magnetic moment for each atom. Defaults to 0.5.
 
     Raises:
-        ValueError: if the magmom_tol is not a real number (float, int, etc).
+        ValueError: if the magmom_tol is not a real number (float, int, etc), a (min, max) tuple or a dictionary,
+        or if a dictionary does not give a tolerance for every atom.
 
     Returns:
         bool: True if at least one of the atoms in the struct has a resulting magnetic moment that is significantly different from the input.
-    """    
-    input_magmoms = extract_input_mag_data(outcar_path)
-    output_magmoms = extract_tot_mag_data(outcar_path)
-    
-    if isinstance(magmom_tol, numbers.Real):
-        magmom_tol = abs(magmom_tol)
-        min_df = input_magmoms.copy()
-        max_df = input_magmoms.copy()
-        min_df['tot'] = min_df['tot'] - magmom_tol
-        max_df['tot'] = max_df['tot'] + magmom_tol
-    # elif isinstance(magmom_tol, dict):
-    #     pass
-    # elif isinstance(magmom_tol, tuple):
-    #     pass
+    """
+    mag_data = extract_input_and_tot_mag_data(outcar_path)
+    return bool(significant_magmom_changes(mag_data, magmom_tol).any())
+
+
+def screen_magmom_changes(
+    path: str,
+    outcar_name: str = "OUTCAR",
+    magmom_tol: float | tuple[float, float] | dict = 0.5,
+    n_processes: int = 1,
+) -> pd.DataFrame:
+    """Runs significant_magmom_change on every config_*/vol_* directory in a path, in parallel.
+
+    Args:
+        path: Path to "configurations" folder
+        outcar_name: name of the OUTCAR file. Defaults to "OUTCAR".
+        magmom_tol: see significant_magmom_change. Defaults to 0.5.
+        n_processes: number of worker processes. None uses all cores. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: one row per run with columns 'config', 'vol', 'significant_magmom_change', 'changed_ions'
+        (ion numbers outside their tolerance) and 'max_magmom_change' (largest absolute change). Runs with a
+        missing or non magnetic OUTCAR are skipped with a warning.
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count()
+
+    runs = []
+    for config, config_dir_path in _config_dirs(path).items():
+        for vol_dir in sorted(os.listdir(config_dir_path)):
+            if vol_dir.startswith("vol_") and os.path.isdir(os.path.join(config_dir_path, vol_dir)):
+                runs.append((config, vol_dir, os.path.join(config_dir_path, vol_dir, outcar_name)))
+
+    outcar_paths = [outcar_path for _, _, outcar_path in runs]
+    magmom_tols = [magmom_tol] * len(runs)
+    if n_processes == 1 or len(runs) <= 1:
+        results = list(map(_screen_outcar, outcar_paths, magmom_tols))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = list(
+                executor.map(
+                    _screen_outcar,
+                    outcar_paths,
+                    magmom_tols,
+                    chunksize=max(1, len(runs) // (4 * n_processes)),
+                )
+            )
+
+    rows = [
+        {"config": config, "vol": vol_dir, **result}
+        for (config, vol_dir, _), result in zip(runs, results)
+        if result is not None
+    ]
+    return pd.DataFrame(
+        rows,
+        columns=["config", "vol", "significant_magmom_change", "changed_ions", "max_magmom_change"],
+    )
+
+
+def _screen_outcar(outcar_path: str, magmom_tol) -> dict:
+    if not os.path.isfile(outcar_path):
+        print(f"Warning: File {outcar_path} does not exist. Skipping.")
+        return None
+    try:
+        mag_data = extract_input_and_tot_mag_data(outcar_path)
+    except ValueError as e:
+        print(f"Warning: {e} in {outcar_path}. Skipping.")
+        return None
+
+    significant = significant_magmom_changes(mag_data, magmom_tol)
+    change = mag_data["tot"].to_numpy() - mag_data["input_tot"].to_numpy()
+    return {
+        "significant_magmom_change": bool(significant.any()),
+        "changed_ions": mag_data["#_of_ion"].to_numpy()[significant].tolist(),
+        "max_magmom_change": float(np.abs(change).max()),
+    }
+
+
+def significant_magmom_changes(
+    mag_data: pd.DataFrame, magmom_tol: float | tuple[float, float] | dict
+) -> np.ndarray:
+    """Per-ion version of significant_magmom_change.
+
+    Args:
+        mag_data: DataFrame from data_extraction.extract_input_and_tot_mag_data
+        magmom_tol: see significant_magmom_change
+
+    Raises:
+        ValueError: see significant_magmom_change
+
+    Returns:
+        np.ndarray: True for the ions whose resulting moment is outside the tolerance of the input moment
+    """
+    if isinstance(magmom_tol, dict):
+        min_change = np.full(len(mag_data), np.nan)
+        max_change = np.full(len(mag_data), np.nan)
+        species = mag_data["species"].to_numpy()
+        ions = mag_data["#_of_ion"].to_numpy()
+        species_tols = {key: tol for key, tol in magmom_tol.items() if isinstance(key, str)}
+        ion_tols = {key: tol for key, tol in magmom_tol.items() if not isinstance(key, str)}
+        for keys, tols in [(species, species_tols), (ions, ion_tols)]:
+            for key, tol in tols.items():
+                mask = keys == key
+                min_change[mask], max_change[mask] = _magmom_tol_range(tol)
+        missing = np.isnan(min_change)
+        if missing.any():
+            raise ValueError(f"magmom_tol does not give a tolerance for ions {ions[missing].tolist()}")
     else:
-        raise ValueError("magmom_tol must be a real number (float, int, etc) or a dictionary")
-    for index, row in output_magmoms.iterrows():
-        if row['tot'] < min_df['tot'][index] or row['tot'] > max_df['tot'][index]:
-            return True
-    return False
-    
\ No newline at end of file
+        min_change, max_change = _magmom_tol_range(magmom_tol)
+
+    input_magmoms = mag_data["input_tot"].to_numpy()
+    tot = mag_data["tot"].to_numpy()
+    return (tot < input_magmoms + min_change) | (tot > input_magmoms + max_change)
+
+
+def _magmom_tol_range(magmom_tol) -> tuple[float, float]:
+    if isinstance(magmom_tol, numbers.Real):
+        return -abs(magmom_tol), abs(magmom_tol)
+    if (
+        isinstance(magmom_tol, tuple)
+        and len(magmom_tol) == 2
+        and all(isinstance(value, numbers.Real) for value in magmom_tol)
+        and magmom_tol[0] <= magmom_tol[1]
+    ):
+        return float(magmom_tol[0]), float(magmom_tol[1])
+    raise ValueError("magmom_tol must be a real number (float, int, etc), a (min, max) tuple or a dictionary")
@@ -0,0 +1,290 @@
+"""
+Stores aggregated results on MongoDB.
+
+Three collections are used:
+    configurations: rows from aggregate_extraction.extract_configuration_data, keyed on (project, config, volume)
+    eos_fits: rows from the eos_parameters_df of eos_fit.fit_to_all_eos, keyed on (project, config, EOS)
+    quasi_harmonic: rows from qha_yphon.quasi_harmonic, keyed on (project, config, temperature)
+
+All writes are batched, unordered bulk_write upserts, so re-ingesting a project updates the existing documents
+instead of duplicating them. Every function takes a pymongo Database, e.g. pymongo.MongoClient()["dfttk"], or
+a mongomock database for testing.
+"""
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+
+CONFIGURATIONS_COLLECTION = "configurations"
+EOS_FITS_COLLECTION = "eos_fits"
+QUASI_HARMONIC_COLLECTION = "quasi_harmonic"
+
+CONFIGURATIONS_KEYS = ["project", "config", "volume"]
+EOS_FITS_KEYS = ["project", "config", "EOS"]
+QUASI_HARMONIC_KEYS = ["project", "config", "temperature"]
+
+
+def create_indexes(db) -> None:
+    """Creates the compound indexes used for upserts and queries. Safe to call more than once.
+
+    Args:
+        db (pymongo.database.Database): database to store the results in
+    """
+
+    ASCENDING = _import_pymongo().ASCENDING
+
+    configurations = db[CONFIGURATIONS_COLLECTION]
+    configurations.create_index(
+        [(key, ASCENDING) for key in CONFIGURATIONS_KEYS], unique=True
+    )
+    configurations.create_index([("project", ASCENDING), ("energy_per_atom", ASCENDING)])
+    configurations.create_index(
+        [
+            ("project", ASCENDING),
+            ("magnetic_ordering", ASCENDING),
+            ("energy_per_atom", ASCENDING),
+        ]
+    )
+
+    db[EOS_FITS_COLLECTION].create_index(
+        [(key, ASCENDING) for key in EOS_FITS_KEYS], unique=True
+    )
+    db[QUASI_HARMONIC_COLLECTION].create_index(
+        [(key, ASCENDING) for key in QUASI_HARMONIC_KEYS], unique=True
+    )
+
+
+def insert_configuration_data(
+    db, df: pd.DataFrame, project: str, batch_size: int = 1000
+) -> int:
+    """Upserts the rows of extract_configuration_data (or recursive_extract_configuration_data) into the
+    configurations collection.
+
+    Args:
+        db (pymongo.database.Database): database to store the results in
+        df (pd.DataFrame): DataFrame with at least the columns 'config' and 'volume'
+        project (str): name of the project the configurations belong to
+        batch_size (int, optional): number of upserts sent per bulk_write. Defaults to 1000.
+
+    Returns:
+        int: number of documents inserted or modified
+    """
+
+    return _bulk_upsert(
+        db[CONFIGURATIONS_COLLECTION],
+        df.assign(project=project),
+        CONFIGURATIONS_KEYS,
+        batch_size,
+    )
+
+
+def insert_eos_parameters(
+    db, eos_parameters_df: pd.DataFrame, project: str, batch_size: int = 1000
+) -> int:
+    """Upserts EOS fits into the eos_fits collection.
+
+    Args:
+        db (pymongo.database.Database): database to store the results in
+        eos_parameters_df (pd.DataFrame): eos_parameters_df (or eos_df) from eos_fit.fit_to_all_eos
+        project (str): name of the project the configurations belong to
+        batch_size (int, optional): number of upserts sent per bulk_write. Defaults to 1000.
+
+    Returns:
+        int: number of documents inserted or modified
+    """
+
+    return _bulk_upsert(
+        db[EOS_FITS_COLLECTION],
+        eos_parameters_df.assign(project=project),
+        EOS_FITS_KEYS,
+        batch_size,
+    )
+
+
+def insert_quasi_harmonic(
+    db,
+    quasi_harmonic_properties: pd.DataFrame,
+    project: str,
+    config: str,
+    batch_size: int = 1000,
+) -> int:
+    """Upserts quasi-harmonic properties of one configuration into the quasi_harmonic collection.
+
+    Args:
+        db (pymongo.database.Database): database to store the results in
+        quasi_harmonic_properties (pd.DataFrame): DataFrame from qha_yphon.quasi_harmonic
+        project (str): name of the project the configuration belongs to
+        config (str): name of the configuration
+        batch_size (int, optional): number of upserts sent per bulk_write. Defaults to 1000.
+
+    Returns:
+        int: number of documents inserted or modified
+    """
+
+    return _bulk_upsert(
+        db[QUASI_HARMONIC_COLLECTION],
+        quasi_harmonic_properties.assign(project=project, config=str(config)),
+        QUASI_HARMONIC_KEYS,
+        batch_size,
+    )
+
+
+def query_configuration_data(
+    db,
+    project: str = None,
+    query: dict = None,
+    columns: list[str] = None,
+    sort: list[tuple[str, int]] = None,
+    limit: int = 0,
+) -> pd.DataFrame:
+    """Queries the configurations collection and returns the matching documents as a DataFrame.
+
+    Example:
+        # The 10 lowest energy_per_atom AFM configurations
+        query_configuration_data(db, "FeNi", {"magnetic_ordering": "AFM"}, sort=[("energy_per_atom", 1)], limit=10)
+
+    Args:
+        db (pymongo.database.Database): database the results are stored in
+        project (str, optional): only return documents of this project. Defaults to None.
+        query (dict, optional): additional MongoDB filter. Defaults to None.
+        columns (list[str], optional): fields to return. Defaults to None, which returns all fields.
+        sort (list[tuple[str, int]], optional): MongoDB sort specification. Defaults to None.
+        limit (int, optional): maximum number of documents, 0 for no limit. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: the matching documents
+    """
+
+    return _query(db[CONFIGURATIONS_COLLECTION], project, query, columns, sort, limit)
+
+
+def query_eos_parameters(
+    db,
+    project: str = None,
+    config: str = None,
+    eos: str = None,
+    columns: list[str] = None,
+) -> pd.DataFrame:
+    """Queries the eos_fits collection and returns the matching documents as a DataFrame.
+
+    Args:
+        db (pymongo.database.Database): database the results are stored in
+        project (str, optional): only return documents of this project. Defaults to None.
+        config (str, optional): only return fits of this configuration. Defaults to None.
+        eos (str, optional): only return fits of this EOS, e.g. "BM4". Defaults to None.
+        columns (list[str], optional): fields to return. Defaults to None, which returns all fields.
+
+    Returns:
+        pd.DataFrame: the matching documents
+    """
+
+    query = {}
+    if config is not None:
+        query["config"] = str(config)
+    if eos is not None:
+        query["EOS"] = eos
+    return _query(db[EOS_FITS_COLLECTION], project, query, columns, None, 0)
+
+
+def query_quasi_harmonic(
+    db,
+    project: str = None,
+    config: str = None,
+    columns: list[str] = None,
+) -> pd.DataFrame:
+    """Queries the quasi_harmonic collection and returns the matching documents sorted by temperature.
+
+    Args:
+        db (pymongo.database.Database): database the results are stored in
+        project (str, optional): only return documents of this project. Defaults to None.
+        config (str, optional): only return documents of this configuration. Defaults to None.
+        columns (list[str], optional): fields to return. Defaults to None, which returns all fields.
+
+    Returns:
+        pd.DataFrame: the matching documents
+    """
+
+    query = {}
+    if config is not None:
+        query["config"] = str(config)
+    return _query(
+        db[QUASI_HARMONIC_COLLECTION],
+        project,
+        query,
+        columns,
+        [("config", 1), ("temperature", 1)],
+        0,
+    )
+
+
+def _bulk_upsert(collection, df: pd.DataFrame, keys: list[str], batch_size: int) -> int:
+    UpdateOne = _import_pymongo().UpdateOne
+
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+    missing_keys = [key for key in keys if key not in df.columns]
+    if missing_keys:
+        raise ValueError(f"DataFrame is missing the key columns {missing_keys}")
+
+    df = df.copy()
+    df["config"] = df["config"].astype(str)
+    documents = _to_documents(df)
+
+    number_of_documents = 0
+    for start in range(0, len(documents), batch_size):
+        requests = [
+            UpdateOne(
+                {key: document[key] for key in keys}, {"$set": document}, upsert=True
+            )
+            for document in documents[start : start + batch_size]
+        ]
+        result = collection.bulk_write(requests, ordered=False)
+        number_of_documents += result.upserted_count + result.modified_count
+    return number_of_documents
+
+
+def _to_documents(df: pd.DataFrame) -> list[dict]:
+    # to_dict already returns python scalars for numeric columns. Array and DataFrame cells (e.g. the EOS
+    # curves or the nested mag_data) are converted to lists so they can be encoded as BSON.
+    documents = df.to_dict("records")
+    for document in documents:
+        for key, value in document.items():
+            if isinstance(value, np.ndarray):
+                document[key] = value.tolist()
+            elif isinstance(value, pd.DataFrame):
+                document[key] = value.to_dict("list")
+            elif isinstance(value, np.poly1d):
+                document[key] = value.coeffs.tolist()
+            elif isinstance(value, np.generic):
+                document[key] = value.item()
+    return documents
+
+
+def _query(collection, project, query, columns, sort, limit) -> pd.DataFrame:
+    query = dict(query) if query else {}
+    if project is not None:
+        query["project"] = project
+
+    projection = {"_id": False}
+    if columns is not None:
+        projection.update({column: True for column in columns})
+
+    cursor = collection.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    df = pd.DataFrame(list(cursor))
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return df
+
+
+def _import_pymongo():
+    try:
+        import pymongo
+    except ImportError as e:
+        raise ImportError(
+            "pymongo is required for MongoDB storage. Install it with 'pip install dfttk2[mongodb]'"
+        ) from e
+    return pymongo
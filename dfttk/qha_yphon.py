@@ -522,11 +522,17 @@ def fit_harmonic(harmonic_properties: pd.DataFrame, order: int) -> pd.DataFrame:
     return harmonic_properties_fit
 
 
-def plot_fit_harmonic(harmonic_properties_fit: pd.DataFrame):
+def plot_fit_harmonic(
+    harmonic_properties_fit: pd.DataFrame, show_fig: bool = True
+) -> dict[str, go.Figure]:
     """Plots the fitted harmonic properties
 
     Args:
         harmonic_properties_fit (pd.DataFrame): fitted harmonic properties dataframe from the fit_harmonic function
+        show_fig (bool, optional): Defaults to True.
+
+    Returns:
+        dict[str, go.Figure]: the figures of 'f_vib', 's_vib' and 'cv_vib'
     """
 
     scale_atoms = harmonic_properties_fit["number_of_atoms"].iloc[0]
@@ -543,6 +549,7 @@ def plot_fit_harmonic(harmonic_properties_fit: pd.DataFrame):
         ("s_vib", "s_vib_fit"),
         ("cv_vib", "cv_vib_fit"),
     ]
+    figs = {}
     for y_value, y_value_fit in y_values:
         fig = go.Figure()
         i = 0
@@ -597,7 +604,13 @@ def plot_fit_harmonic(harmonic_properties_fit: pd.DataFrame):
             y_title = f"C<sub>vib</sub> (eV/K/{scale_atoms} atoms)"
 
         plot_format(fig, f"Volume (Å³/{scale_atoms} atoms)", y_title)
-        fig.show()
+        figs[y_value] = fig
+
+    if show_fig:
+        for fig in figs.values():
+            fig.show()
+
+    return figs
 
 
 # TODO: At the moment, only supports BM4. Add other EOS. Also, add a way to choose the EOS.
@@ -652,7 +665,9 @@ def quasi_harmonic(
         free_energy_list.append(free_energy)
         volume_range_list.append(volume_range)
 
-        _, eos_parameters, _, _, _ = eos_fit.BM4(volume_range, free_energy)
+        _, eos_parameters, _, _, _ = eos_fit.fit_eos_cached(
+            "BM4", volume_range, free_energy
+        )
         V0_list.append(eos_parameters[0])
         F0_list.append(eos_parameters[1])
         B_list.append(eos_parameters[2])
@@ -708,14 +723,23 @@ def quasi_harmonic(
     return quasi_harmonic_properties
 
 
-def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str = 'default'):
+def plot_quasi_harmonic(
+    quasi_harmonic_properties: pd.DataFrame,
+    plot_type: str = 'default',
+    show_fig: bool = True,
+) -> dict[str, go.Figure]:
     """Plots the quasi-harmonic properties
 
     Args:
         quasi_harmonic_properties (pd.DataFrame): pandas dataframe containing the quasi-harmonic properties from the quasi_harmonic function
         plot_type (str, optional): Type of plots to include. Defaults to 'default'.
-    """    
-    
+        show_fig (bool, optional): Defaults to True.
+
+    Returns:
+        dict[str, go.Figure]: the figures by name, e.g. 'free_energy', 'volume', 'CTE', 'entropy' and 'Cp' for the
+        default plot_type
+    """
+
     temperature_list = quasi_harmonic_properties["temperature"].values
     spaces = len(temperature_list) - 1
     step = int(spaces / 9)
@@ -726,6 +750,8 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
 
     scale_atoms = quasi_harmonic_properties["number_of_atoms"].iloc[0]
 
+    figs = {}
+
     if plot_type == 'default' or plot_type == 'all':
         # Free energy plot
         fig = go.Figure()
@@ -769,7 +795,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["free_energy"] = fig
 
         # Volume plot
         fig = go.Figure()
@@ -792,7 +818,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["volume"] = fig
 
         # CTE plot
         fig = go.Figure()
@@ -815,7 +841,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["CTE"] = fig
 
         # Entropy plot
         fig = go.Figure()
@@ -838,7 +864,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["entropy"] = fig
 
         # Cp plot
         fig = go.Figure()
@@ -861,7 +887,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["Cp"] = fig
 
     if plot_type == 'all':
         # Enthalpy plot
@@ -885,7 +911,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["enthalpy"] = fig
 
         # Bulk modulus plot
         fig = go.Figure()
@@ -902,7 +928,7 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             ),
         )
         plot_format(fig, f"Temperature (K)", "Bulk modulus (GPa)", width=600, height=600)
-        fig.show()
+        figs["bulk_modulus"] = fig
 
         # Gibbs energy plot
         fig = go.Figure()
@@ -925,4 +951,10 @@ def plot_quasi_harmonic(quasi_harmonic_properties: pd.DataFrame, plot_type: str
             width=600,
             height=600,
         )
-        fig.show()
+        figs["gibbs_energy"] = fig
+
+    if show_fig:
+        for fig in figs.values():
+            fig.show()
+
+    return figs
@@ -0,0 +1,363 @@
+"""
+Stores aggregated results in an embedded SQLite database, for clusters without access to a MongoDB server.
+
+Three tables are used:
+    configurations: rows from aggregate_extraction.extract_configuration_data, keyed on (config, volume)
+    eos_fits: rows from the eos_parameters_df of eos_fit.fit_to_all_eos (or eos_fit.fit_eos_batch), keyed on
+        (config, EOS), including the goodness-of-fit columns (RMS, AIC, BIC, LOO_RMS, best_EOS) and the fitted
+        volume range, so queried rows can be passed to eos_fit.EOSModel.from_row
+    quasi_harmonic: scalar columns of qha_yphon.quasi_harmonic, keyed on (config, temperature)
+
+Inserts replace rows with the same key and run in a single transaction. The query functions return DataFrames.
+Columns added to a table since a database was created are added to it when it is opened.
+"""
+
+# Standard library imports
+import sqlite3
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+
+TABLES = {
+    "configurations": {
+        "columns": {
+            "config": "TEXT NOT NULL",
+            "volume": "REAL NOT NULL",
+            "number_of_atoms": "INTEGER",
+            "volume_per_atom": "REAL",
+            "energy": "REAL",
+            "energy_per_atom": "REAL",
+            "total_magnetic_moment": "REAL",
+            "magnetic_ordering": "TEXT",
+            "space_group": "TEXT",
+        },
+        "keys": ["config", "volume"],
+        "indexes": [
+            ["volume"],
+            ["energy_per_atom"],
+            ["magnetic_ordering", "energy_per_atom"],
+            ["space_group"],
+        ],
+    },
+    "eos_fits": {
+        "columns": {
+            "config": "TEXT NOT NULL",
+            "EOS": "TEXT NOT NULL",
+            "coefficient_a": "REAL",
+            "coefficient_b": "REAL",
+            "coefficient_c": "REAL",
+            "coefficient_d": "REAL",
+            "coefficient_e": "REAL",
+            "V0": "REAL",
+            "E0": "REAL",
+            "B": "REAL",
+            "BP": "REAL",
+            "B2P": "REAL",
+            "RMS": "REAL",
+            "AIC": "REAL",
+            "BIC": "REAL",
+            "LOO_RMS": "REAL",
+            "best_EOS": "TEXT",
+            "volume_min": "REAL",
+            "volume_max": "REAL",
+        },
+        "keys": ["config", "EOS"],
+        "indexes": [["EOS", "E0"], ["config", "LOO_RMS"]],
+        # SQLite column names are case insensitive, so a-e would clash with B
+        "aliases": {name: f"coefficient_{name}" for name in ["a", "b", "c", "d", "e"]},
+    },
+    "quasi_harmonic": {
+        "columns": {
+            "config": "TEXT NOT NULL",
+            "temperature": "REAL NOT NULL",
+            "number_of_atoms": "INTEGER",
+            "V0": "REAL",
+            "F0": "REAL",
+            "B": "REAL",
+            "BP": "REAL",
+            "S0": "REAL",
+            "H0": "REAL",
+            "CTE": "REAL",
+            "Cp": "REAL",
+        },
+        "keys": ["config", "temperature"],
+        "indexes": [],
+    },
+}
+
+
+def connect(path: str = "dfttk.sqlite") -> sqlite3.Connection:
+    """Opens (or creates) a SQLite results database and creates the tables and indexes if needed.
+
+    Args:
+        path (str, optional): path to the database file, or ":memory:". Defaults to "dfttk.sqlite".
+
+    Returns:
+        sqlite3.Connection: connection to the database
+    """
+
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    return conn
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Creates the tables and indexes and adds missing columns to existing tables. Safe to call more than once.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+    """
+
+    with conn:
+        for table, schema in TABLES.items():
+            column_definitions = ", ".join(
+                f'"{column}" {column_type}'
+                for column, column_type in schema["columns"].items()
+            )
+            primary_key = ", ".join(f'"{key}"' for key in schema["keys"])
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"({column_definitions}, PRIMARY KEY ({primary_key}))"
+            )
+            # Databases created by an older version lack the newer columns
+            existing_columns = {
+                row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+            }
+            for column, column_type in schema["columns"].items():
+                if column not in existing_columns:
+                    conn.execute(
+                        f'ALTER TABLE {table} ADD COLUMN "{column}" {column_type}'
+                    )
+            for index_columns in schema["indexes"]:
+                index_name = f"{table}_{'_'.join(index_columns)}_index"
+                columns = ", ".join(f'"{column}"' for column in index_columns)
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"
+                )
+
+
+def insert_configuration_data(conn: sqlite3.Connection, df: pd.DataFrame) -> int:
+    """Inserts the rows of extract_configuration_data (or recursive_extract_configuration_data). Rows with an
+    existing (config, volume) are replaced. Columns that are not part of the table (e.g. mag_data) are ignored.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        df (pd.DataFrame): DataFrame with at least the columns 'config' and 'volume'
+
+    Returns:
+        int: number of rows written
+    """
+
+    return _insert(conn, "configurations", df)
+
+
+def insert_eos_parameters(conn: sqlite3.Connection, eos_parameters_df: pd.DataFrame) -> int:
+    """Inserts EOS fits. Rows with an existing (config, EOS) are replaced.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        eos_parameters_df (pd.DataFrame): eos_parameters_df (or eos_df) from eos_fit.fit_to_all_eos
+
+    Returns:
+        int: number of rows written
+    """
+
+    return _insert(conn, "eos_fits", eos_parameters_df)
+
+
+def insert_quasi_harmonic(
+    conn: sqlite3.Connection, quasi_harmonic_properties: pd.DataFrame, config: str
+) -> int:
+    """Inserts the scalar quasi-harmonic properties of one configuration. Rows with an existing
+    (config, temperature) are replaced.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        quasi_harmonic_properties (pd.DataFrame): DataFrame from qha_yphon.quasi_harmonic
+        config (str): name of the configuration
+
+    Returns:
+        int: number of rows written
+    """
+
+    return _insert(
+        conn, "quasi_harmonic", quasi_harmonic_properties.assign(config=str(config))
+    )
+
+
+def query_configuration_data(
+    conn: sqlite3.Connection,
+    where: str = None,
+    params: tuple = (),
+    columns: list[str] = None,
+    order_by: list[str] = None,
+    limit: int = None,
+) -> pd.DataFrame:
+    """Queries the configurations table.
+
+    Example:
+        query_configuration_data(conn, "magnetic_ordering = ?", ("AFM",), order_by=["energy_per_atom"], limit=10)
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        where (str, optional): SQL condition with ? placeholders. Defaults to None.
+        params (tuple, optional): values for the placeholders in where. Defaults to ().
+        columns (list[str], optional): columns to return. Defaults to None, which returns all columns.
+        order_by (list[str], optional): columns to sort by. Defaults to None.
+        limit (int, optional): maximum number of rows. Defaults to None.
+
+    Returns:
+        pd.DataFrame: the matching rows
+    """
+
+    return _select(conn, "configurations", where, params, columns, order_by, limit)
+
+
+def query_config_volumes(conn: sqlite3.Connection, config: str) -> pd.DataFrame:
+    """Returns all volumes of one configuration, sorted by volume.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        config (str): name of the configuration
+
+    Returns:
+        pd.DataFrame: the rows of the configuration
+    """
+
+    return _select(
+        conn, "configurations", "config = ?", (str(config),), None, ["volume"], None
+    )
+
+
+def query_lowest_energy_configurations(
+    conn: sqlite3.Connection, group_by: str = "magnetic_ordering", n: int = 1
+) -> pd.DataFrame:
+    """Returns the n configurations with the lowest energy_per_atom for each value of group_by. Each
+    configuration is represented by its lowest energy_per_atom volume.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        group_by (str, optional): column to group by, e.g. "magnetic_ordering" or "space_group".
+        Defaults to "magnetic_ordering".
+        n (int, optional): number of configurations per group. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: the selected rows with a 'rank' column (1 = lowest energy in the group)
+    """
+
+    _check_columns("configurations", [group_by])
+    query = f"""
+        WITH config_minimum AS (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY config ORDER BY energy_per_atom
+            ) AS config_rank
+            FROM configurations
+        ),
+        ranked AS (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY "{group_by}" ORDER BY energy_per_atom
+            ) AS rank
+            FROM config_minimum
+            WHERE config_rank = 1
+        )
+        SELECT * FROM ranked WHERE rank <= ? ORDER BY "{group_by}", rank
+    """
+    df = pd.read_sql_query(query, conn, params=(n,))
+    return df.drop(columns=["config_rank"])
+
+
+def query_eos_parameters(
+    conn: sqlite3.Connection, config: str = None, eos: str = None
+) -> pd.DataFrame:
+    """Queries the eos_fits table.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        config (str, optional): only return fits of this configuration. Defaults to None.
+        eos (str, optional): only return fits of this EOS, e.g. "BM4". Defaults to None.
+
+    Returns:
+        pd.DataFrame: the matching rows
+    """
+
+    conditions, params = [], []
+    if config is not None:
+        conditions.append("config = ?")
+        params.append(str(config))
+    if eos is not None:
+        conditions.append("EOS = ?")
+        params.append(eos)
+    where = " AND ".join(conditions) if conditions else None
+    return _select(conn, "eos_fits", where, tuple(params), None, ["config", "EOS"], None)
+
+
+def query_quasi_harmonic(conn: sqlite3.Connection, config: str = None) -> pd.DataFrame:
+    """Queries the quasi_harmonic table, sorted by config and temperature.
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+        config (str, optional): only return rows of this configuration. Defaults to None.
+
+    Returns:
+        pd.DataFrame: the matching rows
+    """
+
+    if config is None:
+        where, params = None, ()
+    else:
+        where, params = "config = ?", (str(config),)
+    return _select(
+        conn, "quasi_harmonic", where, params, None, ["config", "temperature"], None
+    )
+
+
+def _insert(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> int:
+    schema = TABLES[table]
+    df = df.rename(columns=schema.get("aliases", {}))
+    missing_keys = [key for key in schema["keys"] if key not in df.columns]
+    if missing_keys:
+        raise ValueError(f"DataFrame is missing the key columns {missing_keys}")
+
+    columns = [column for column in schema["columns"] if column in df.columns]
+    values = df[columns].astype(object).copy()
+    values["config"] = values["config"].astype(str)
+    values = values.where(pd.notna(values), None)
+    rows = [
+        tuple(value.item() if isinstance(value, np.generic) else value for value in row)
+        for row in values.itertuples(index=False, name=None)
+    ]
+
+    column_names = ", ".join(f'"{column}"' for column in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({column_names}) VALUES ({placeholders})",
+            rows,
+        )
+    return len(rows)
+
+
+def _select(conn, table, where, params, columns, order_by, limit) -> pd.DataFrame:
+    _check_columns(table, (columns or []) + (order_by or []))
+    column_names = (
+        ", ".join(f'"{column}"' for column in columns) if columns is not None else "*"
+    )
+    query = f"SELECT {column_names} FROM {table}"
+    if where:
+        query += f" WHERE {where}"
+    if order_by:
+        query += " ORDER BY " + ", ".join(f'"{column}"' for column in order_by)
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    df = pd.read_sql_query(query, conn, params=params)
+    aliases = TABLES[table].get("aliases", {})
+    return df.rename(columns={alias: name for name, alias in aliases.items()})
+
+
+def _check_columns(table: str, columns: list[str]) -> None:
+    unknown_columns = [
+        column for column in columns if column not in TABLES[table]["columns"]
+    ]
+    if unknown_columns:
+        raise ValueError(f"Unknown columns for table {table}: {unknown_columns}")
@@ -41,6 +41,7 @@ def three_step_relaxation(
         path: the path to the folder containing the VASP input files
         vasp_cmd: the VASP commands to run VASP specific to your system. E.g. ["srun", "vasp_std"].
         handlers: custodian handlers to catch errors. See class 'custodian.vasp.handlers.VaspErrorHandler'.
+        Add custodian_handlers.MagneticMomentChangeHandler to stop runs whose magnetic moments collapse or flip.
         copy_magmom: If True, copies the magmom from an OUTCAR file of one run to the INCAR
         file of the next run. Defaults to False.
         backup: If True, appends the original POSCAR, POTCAR, INCAR, and KPOINTS files with
@@ -94,8 +95,10 @@ def three_step_relaxation(
 
     jobs = [step1, step2, step3]
     c = Custodian(handlers, jobs, max_errors=3)
-    c.run()
-    os.chdir(original_dir)
+    try:
+        c.run()
+    finally:
+        os.chdir(original_dir)
 
 
 # TODO: write tests for this function
@@ -128,12 +131,17 @@ def ev_curve_series(
     """
 
     # Writes a params.json file to keep track of the parameters used
-    errors_subset_list = [handler.errors_subset_to_catch for handler in handlers]
+    # Monitors such as custodian_handlers.MagneticMomentChangeHandler have no errors_subset_to_catch
+    errors_subset_list = [
+        handler.errors_subset_to_catch
+        for handler in handlers
+        if hasattr(handler, "errors_subset_to_catch")
+    ]
     params = {
         "path": path,
         "volumes": volumes,
         "vasp_cmd": vasp_cmd,
-        "handlers": errors_subset_list[0],
+        "handlers": errors_subset_list[0] if errors_subset_list else None,
         "restarting": restarting,
     }
 